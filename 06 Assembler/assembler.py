@@ -2,7 +2,7 @@ from collections import UserDict
 from functools import wraps
 from os import PathLike
 from pathlib import Path
-from typing import Callable, Iterable
+from typing import Callable, Iterable, Iterator
 
 
 # why UserDict?
@@ -40,6 +40,9 @@ class Instruction:
     A = "A"
     C = "C"
 
+    # no __dict__, an instruction is created for every line
+    __slots__ = ("ins", "type")
+
     def __init__(self, instruction: str):
         # first, we need to remove space
         # "D = D + A" -> "D=D+A"
@@ -163,6 +166,8 @@ class Code:
         "R": "110000",
         "!D": "001101",
         "!R": "110001",
+        "-D": "001111",
+        "-R": "110011",
         "D+1": "011111",
         "R+1": "110111",
         "D-1": "001110",
@@ -172,6 +177,10 @@ class Code:
         "R-D": "000111",
         "D&R": "000000",
         "D|R": "010101",
+        # the vm translator writes `M+D`, `M&D` and `M|D`
+        "R+D": "000010",
+        "R&D": "000000",
+        "R|D": "010101",
     }
 
     @classmethod
@@ -187,6 +196,25 @@ class Code:
 
         return a + self.comp_table[part]
 
+    @classmethod
+    def encode(self, ins: Instruction) -> str:
+        """
+        the 16 bits machine code of an instruction
+        """
+        if ins.type == ins.A:
+            if ins.is_symbol:
+                val = symbol_table[ins.value]
+            else:
+                val = int(ins.value)
+            return "0" + "{0:015b}".format(val)
+        else:
+            return (
+                "111"
+                + self.comp(ins.comp)
+                + self.dest(ins.dest)
+                + self.jump(ins.jump)
+            )
+
 
 class Parser:
     def __init__(self, filepath: PathLike):
@@ -212,16 +240,19 @@ class Parser:
     def first_pass(self, code: Iterable[str]):
         address = 0
 
-        symbols = []
+        # in order of first appearance, every symbol once,
+        # a dict as an ordered set
+        symbols = {}
         for line in code:
             # is Label declaration?
             if line.startswith("("):
                 label = line.strip(" ()")  # e.g. "( foo bar) )" -> "foo bar"
                 symbol_table[label] = address
             else:
-                ins = Instruction(line)
-                if ins.type == "A" and ins.is_symbol:
-                    symbols.append(ins.value)
+                if line.startswith("@"):
+                    value = "".join(line[1:].split())
+                    if not value.isdigit():
+                        symbols[value] = None
                 address += 1
 
         # add symbol should be after adding labels.
@@ -239,27 +270,80 @@ class Parser:
             code.seek(0)
             yield from self.two_pass(self.tidy(code))
 
+    def machine_code(self) -> Iterator[str]:
+        """
+        low memory mode, for programs of millions of lines.
+
+        like `instructions` the file is read twice, but the second pass
+        encodes every line without creating an `Instruction`.
+        memory is bounded by the symbols and the distinct c-instructions,
+        not by the length of the program
+        """
+        with open(self.filepath, "rt") as code:
+            self.first_pass(self.tidy(code))
+            code.seek(0)
+            c_instructions = {}
+            for line in self.tidy(code):
+                if line.startswith("("):
+                    continue
+                line = "".join(line.split())
+                if line.startswith("@"):
+                    value = line[1:]
+                    address = int(value) if value.isdigit() else symbol_table[value]
+                    yield f"0{address:015b}"
+                else:
+                    bits = c_instructions.get(line)
+                    if bits is None:
+                        bits = c_instructions[line] = Code.encode(Instruction(line))
+                    yield bits
+
+    def stream(self, code: Iterable[str]):
+        """
+        for input which can't be read twice, e.g. stdin.
+        only the tidied lines are kept for the second pass
+        """
+        code = list(self.tidy(code))
+        self.first_pass(code)
+        yield from self.two_pass(code)
+
 
 if __name__ == "__main__":
+    import argparse
+    import shutil
     import sys
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="assemble .asm into .hack")
+    parser.add_argument("asm_file", help="or - for stdin, written to stdout")
+    parser.add_argument(
+        "--low-memory",
+        action="store_true",
+        help="don't keep or print the instructions, for huge programs",
+    )
+    args = parser.parse_args()
+
+    # `python vm_translator.py - < Foo.vm | python assembler.py - > Foo.hack`
+    if args.asm_file == "-":
+        if args.low_memory:
+            # stdin can't be read twice, spool it to disk instead of memory
+            with tempfile.NamedTemporaryFile("w+t", suffix=".asm") as spool:
+                shutil.copyfileobj(sys.stdin, spool)
+                spool.flush()
+                sys.stdout.writelines(
+                    bits + "\n" for bits in Parser(spool.name).machine_code()
+                )
+        else:
+            for ins in Parser(None).stream(sys.stdin):
+                print(Code.encode(ins))
+        sys.exit()
 
-    asm_file = Path(sys.argv[1])
+    asm_file = Path(args.asm_file)
     hack_file = (Path(".") / asm_file.name).with_suffix(".hack")
 
     with open(hack_file, "wt+") as out:
-        for ins in Parser(asm_file).instructions():
-            print(ins)
-            if ins.type == ins.A:
-                if ins.is_symbol:
-                    val = symbol_table[ins.value]
-                else:
-                    val = int(ins.value)
-                code = "0" + "{0:015b}".format(val)
-            else:
-                code = (
-                    "111"
-                    + Code.comp(ins.comp)
-                    + Code.dest(ins.dest)
-                    + Code.jump(ins.jump)
-                )
-            out.write(code + "\n")
+        if args.low_memory:
+            out.writelines(bits + "\n" for bits in Parser(asm_file).machine_code())
+        else:
+            for ins in Parser(asm_file).instructions():
+                print(ins)
+                out.write(Code.encode(ins) + "\n")
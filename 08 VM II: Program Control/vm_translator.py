@@ -82,7 +82,7 @@ class Label:
 
 
 class Parser:
-    def __init__(self, path: PathLike):
+    def __init__(self, path: PathLike = None):
         self.path = path
 
     def skip(self, code: Iterable[str], predicate: Callable[[str], bool]):
@@ -108,12 +108,34 @@ class Parser:
         """
         for vm_file in Path(self.path).glob("*.vm"):
             with open(vm_file, "rt") as code:
-                for line in self.tidy(code):
-                    tokens = line.split()
-                    yield tokens, vm_file.stem
+                yield from self.stream(code, vm_file.stem)
+
+    def stream(self, code: Iterable[str], filename: str = None):
+        """
+        yield tokens and the filename, from any iterable of lines,
+        e.g. stdin, or a generator of vm commands
+
+        without a filename, it's taken from the function being defined,
+        `function Foo.bar 2` -> "Foo", like the file a Jack class compiles to.
+        so the statics of concatenated .vm files don't mix up
+        """
+        current = filename or "Stdin"
+        for line in self.tidy(code):
+            tokens = line.split()
+            if filename is None and tokens[0] == "function":
+                current = tokens[1].split(".")[0]
+            yield tokens, current
 
 
 class Translator:
+    # the function being translated, labels are local to it
+    function_name = None
+
+    def __init__(self):
+        # the routines of `call` and `return` are the same for every function,
+        # written once by `routines`, and every call site jumps to them
+        self.shared = set()
+
     def bootstrap(self):
         """
         One of the OS libraries, called Sys.vm, includes a method called init.
@@ -165,27 +187,23 @@ class Translator:
 
     def stack_push(self, what: str):
         """
-        set the value of the tip of stack
-        and move forward
+        move forward
+        and set the value of the tip of stack
         """
-        # M[M[SP]] = D  // ok, we know SP == 0
-        yield from self.address_pointer("SP")
-        yield f"M={what}"
-
-        # SP = SP + 1
+        # SP = SP + 1, and A = SP - 1, the old tip
         yield "@SP"
-        yield "M=M+1"
+        yield "AM=M+1"
+        yield "A=A-1"
+        yield f"M={what}"
 
     def stack_pop(self, what: str):
         """
         move back stack pointer
         and ready to get the value of the tip of stack, by M
         """
-        # SP = SP - 1
+        # SP = SP - 1, and A = SP
         yield "@SP"
-        yield "M=M-1"
-
-        yield from self.address_pointer("SP")
+        yield "AM=M-1"
         if "=" in what:
             yield what
         else:
@@ -264,91 +282,140 @@ class Translator:
                         yield from self.stack_push("D")
 
             case "local" | "argument" | "this" | "that":
+                register = registers[segment]
+                # the first two slots are addressed without loading the index
+                nearby = {0: "A=M", 1: "A=M+1"}.get(index)
                 if action == "pop":
-                    # pop to D
-                    # and save it to R13
-                    yield from self.stack_pop("D")
-                    yield "@R13"
-                    yield "M=D"
+                    if nearby:
+                        yield from self.stack_pop("D")
+                        yield f"@{register}"
+                        yield nearby
+                        yield "M=D"
+                        return
 
+                    # save address (M[pointer] + index) to R13
                     yield from self.load_const(index, "D")
-
-                    # save address (M[pointer] + index) to R14
-                    yield "@{}".format(registers[segment])
+                    yield f"@{register}"
                     yield "D=D+M"
-                    yield "@R14"
-                    yield "M=D"
-
-                    # M[M[R14]] = M[R13]
                     yield "@R13"
-                    yield "D=M"
+                    yield "M=D"
 
-                    yield from self.address_pointer("R14")
+                    # M[M[R13]] = pop()
+                    yield from self.stack_pop("D")
+                    yield from self.address_pointer("R13")
                     yield "M=D"
                 elif action == "push":
-                    yield from self.load_const(index, "D")
-                    yield "@{}".format(registers[segment])
-                    yield "A=D+M"
+                    if nearby:
+                        yield f"@{register}"
+                        yield nearby
+                    else:
+                        yield from self.load_const(index, "D")
+                        yield f"@{register}"
+                        yield "A=D+M"
                     yield "D=M"
                     yield from self.stack_push("D")
 
+    def stack_push_pop(self, action: str, offset: int):
+        """
+        `stack` is not a real vm segment, the inliner uses it
+        to address the args and locals of an inlined function,
+        which live at a known distance below the tip of stack
+
+        push stack k    // push *(SP - k)
+        pop stack k     // v = pop(); *(SP - k) = v
+        """
+        match action:
+            case "push":
+                yield from self.load_const(offset, "D")
+                yield "@SP"
+                yield "A=M-D"
+                yield "D=M"
+                yield from self.stack_push("D")
+            case "pop":
+                # R13 = SP - k - 1, the address after the pop
+                yield from self.load_const(offset + 1, "D")
+                yield "@SP"
+                yield "D=M-D"
+                yield "@R13"
+                yield "M=D"
+
+                yield from self.stack_pop("D")
+                yield from self.address_pointer("R13")
+                yield "M=D"
+
+    def drop(self, count: int):
+        """
+        SP = SP - count
+        """
+        if count == 1:
+            yield "@SP"
+            yield "M=M-1"
+        elif count > 1:
+            yield from self.load_const(count, "D")
+            yield "@SP"
+            yield "M=M-D"
+
     def arithmetic(self, operator: str):
         match operator:
             case "add" | "sub" | "and" | "or":
+                # y = pop(), and x is changed in place
                 yield from self.stack_pop("D")
-                yield from self.stack_pop("D=M{}D".format(operator_symbols[operator]))
-                yield from self.stack_push("D")
+                yield "A=A-1"
+                yield "M=M{}D".format(operator_symbols[operator])
 
             case "neg" | "not":
-                yield from self.stack_pop("D")
-                yield "D={}D".format(operator_symbols[operator])
-                yield from self.stack_push("D")
+                yield "@SP"
+                yield "A=M-1"
+                yield "M={}M".format(operator_symbols[operator])
 
             case "eq" | "lt" | "gt":
                 """
                 algorithm:
 
+                x = -1
                 if true
-                    goto set_true
-                (set_false)
-                    push 0
                     goto endjump
-                (set_true)
-                    push -1
+                x = 0
                 (endjump)
                 """
 
                 yield from self.stack_pop("D")
                 # have to M-D
                 # because x is under the y, or x is pushed first
-                yield from self.stack_pop("D=M-D")
-                set_true = Label("set_true")
-
-                yield set_true.address
-                yield "D;{}".format(operator_symbols[operator])
+                yield "A=A-1"
+                yield "D=M-D"
+                yield "M=-1"
 
                 endjump = Label("endjump")
-                # default: set_false
-                yield from self.stack_push("0")
                 yield endjump.address
-                yield "0;JMP"
+                yield "D;{}".format(operator_symbols[operator])
 
-                yield set_true.define
-                yield from self.stack_push("-1")
+                yield "@SP"
+                yield "A=M-1"
+                yield "M=0"
 
                 yield endjump.define
 
+    def scoped(self, label_name: str) -> str:
+        """
+        `label LOOP` in function Foo.bar is `(Foo.bar$LOOP)`,
+        so every function can have its own LOOP
+        """
+        if self.function_name is None:
+            return label_name
+        return f"{self.function_name}${label_name}"
+
     def label(self, name: str):
         """
         label declaration command
         """
-        yield f"({name})"
+        yield f"({self.scoped(name)})"
 
     def goto(self, label_name: str):
         """
         // jump to execute the command just after label
         """
-        yield f"@{label_name}"
+        yield f"@{self.scoped(label_name)}"
         yield "0;JMP"
 
     def if_goto(self, label_name: str):
@@ -357,7 +424,7 @@ class Translator:
         // if cond jump to execute the command just after label
         """
         yield from self.stack_pop("D")
-        yield f"@{label_name}"
+        yield f"@{self.scoped(label_name)}"
         yield "D;JNE"
 
     def function(self, name: str, n_vars: int):
@@ -366,6 +433,7 @@ class Translator:
         repeat nVars times: // nVars = number of local variables
             push 0          // initializes the local variables to 0
         """
+        self.function_name = name
         # function name
         yield f"({name})"
         for _ in range(n_vars):
@@ -373,6 +441,16 @@ class Translator:
 
     def ret(self):
         """
+        goto $RETURN, see `return_routine`
+        """
+        self.shared.add("$RETURN")
+        yield "@$RETURN"
+        yield "0;JMP"
+
+    def return_routine(self):
+        """
+        ($RETURN), what every `return` jumps to
+
         endFrame = LCL              // endframe is a temporary variable
         retAddr = *(endFrame - 5)   // gets the return address
         *ARG = pop()                // repositions the return value for the caller
@@ -391,36 +469,18 @@ class Translator:
         无参数的 function
         RIP 被 return value 覆盖了，解决这个 bug 花费了我四五个钟头
         """
-        # endFrame(R13) = LCL // endframe is a temporary variable
+        yield "($RETURN)"
+
+        # save return address to temporary register, R14 = *(LCL - 5)
+        yield "@5"
+        yield "D=A"
         yield "@LCL"
+        yield "A=M-D"
         yield "D=M"
-        yield "@R13"
+        yield "@R14"
         yield "M=D"
 
-        def restore(register: str, offset: int):
-            """
-            restores registers of the caller
-            e.g.
-            THAT = ROM[endFrame – 1] // restores THAT of the caller
-            """
-            yield "@R13"  # endFrame
-            yield "D=M"
-            if offset == 1:
-                yield "D=D-1"
-            else:
-                yield f"@{offset}"
-                yield "D=D-A"
-            yield "A=D"
-            yield "D=M"
-            yield f"@{register}"
-            yield "M=D"
-
-        # save return address to temporary register
-        yield from restore("R14", 5)
-
         # let's *ARG = pop() // repositions the return value for the caller
-        # also can write as:
-        # # yield from self.translate(["pop","argument", "0"])
         #
         # 但有一种特殊 case，当 nArgs 为 0 时(Functions with no arguments)
         # ARG 和 return address/RIP(Return Instruction Point) 便会共用一个地址
@@ -433,16 +493,23 @@ class Translator:
         yield "M=D"
 
         # SP = ARG + 1 // repositions SP of the caller
-        yield "@ARG"
-        yield "D=M+1"
+        yield "D=A+1"
         yield "@SP"
         yield "M=D"
 
-        # continue some restorings
-        yield from restore("THAT", 1)
-        yield from restore("THIS", 2)
-        yield from restore("ARG", 3)
-        yield from restore("LCL", 4)
+        # restores THAT, THIS, ARG of the caller, LCL walks down the saved frame
+        for register in ["THAT", "THIS", "ARG"]:
+            yield "@LCL"
+            yield "AM=M-1"
+            yield "D=M"
+            yield f"@{register}"
+            yield "M=D"
+        # and LCL itself, the last
+        yield "@LCL"
+        yield "A=M-1"
+        yield "D=M"
+        yield "@LCL"
+        yield "M=D"
 
         # finally, goodbye，I'm go home now
         # goto *R14(ROM[R14] is saved return address)
@@ -461,10 +528,34 @@ class Translator:
         (Foo$ret.1) // created and plugged by the translator
         """
         label = Label(function_name)
+        self.shared.add("$CALL")
 
-        # push retAddrLabel // Using a translator-generated label
+        # R14 = nArgs, R13 = functionName, D = retAddrLabel
+        if n_args in [0, 1]:
+            yield "@R14"
+            yield f"M={n_args}"
+        else:
+            yield from self.load_const(n_args, "R14")
+        yield f"@{function_name}"
+        yield "D=A"
+        yield "@R13"
+        yield "M=D"
         yield label.ret.address
         yield "D=A"
+        yield "@$CALL"
+        yield "0;JMP"
+
+        # (retAddrLabel) // the same translator-generated label
+        yield label.ret.define
+
+    def call_routine(self):
+        """
+        ($CALL), what every `call` jumps to,
+        with nArgs in R14, the function in R13, and the return address in D
+        """
+        yield "($CALL)"
+
+        # push retAddrLabel
         yield from self.stack_push("D")
 
         # Saves registers of the caller
@@ -474,13 +565,12 @@ class Translator:
             yield from self.stack_push("D")
 
         # ARG = SP-5-nArgs // Repositions ARG
-        yield "@SP"
+        yield "@R14"
         yield "D=M"
         yield "@5"
-        yield "D=D-A"
-        if n_args > 0:
-            yield f"@{n_args}"
-            yield "D=D-A"
+        yield "D=D+A"
+        yield "@SP"
+        yield "D=M-D"
         yield "@ARG"
         yield "M=D"
 
@@ -491,15 +581,99 @@ class Translator:
         yield "M=D"
 
         # goto functionName // Transfers control to the called function
-        yield from self.translate(["goto", function_name])
+        yield from self.address_pointer("R13")
+        yield "0;JMP"
 
-        # (retAddrLabel) // the same translator-generated label
-        yield label.ret.define
+    def routines(self):
+        """
+        the shared code of `call` and `return`, after the whole program.
+        nothing runs into it: a program ends in a loop, or returns
+        """
+        if "$CALL" in self.shared:
+            yield from self.call_routine()
+        if "$RETURN" in self.shared:
+            yield from self.return_routine()
+
+    def tail_call(self, function_name: str, n_args: int, caller_args: int):
+        """
+        call Bar.mult 2
+        return
+
+        the frame of the caller is reused instead of building a new one
+        on top of it, `return` of Bar.mult goes straight back to our caller:
+
+        ARG[0..nArgs-1] = the args on the stack   // replaces the args of caller
+        move the saved frame of the caller to just after them
+        LCL = SP = ARG + nArgs + 5
+        goto Bar.mult
+
+        both copies move words downwards and never overlap badly,
+        because `nArgs <= callerArgs` (see `TailCalls`).
+        when they are equal, the saved frame is already in place
+        """
+        # R13 = ARG, R14 = SP - nArgs
+        yield "@ARG"
+        yield "D=M"
+        yield "@R13"
+        yield "M=D"
+        yield "@SP"
+        yield "D=M"
+        if n_args > 0:
+            yield f"@{n_args}"
+            yield "D=D-A"
+        yield "@R14"
+        yield "M=D"
+
+        def copy():
+            """
+            *R13++ = *R14++
+            """
+            yield "@R14"
+            yield "AM=M+1"
+            yield "A=A-1"
+            yield "D=M"
+            yield "@R13"
+            yield "AM=M+1"
+            yield "A=A-1"
+            yield "M=D"
+
+        for _ in range(n_args):
+            yield from copy()
+
+        if n_args != caller_args:
+            # R14 = LCL - 5, the saved frame
+            yield "@LCL"
+            yield "D=M"
+            yield "@5"
+            yield "D=D-A"
+            yield "@R14"
+            yield "M=D"
+            for _ in range(5):
+                yield from copy()
+
+            # LCL = R13 = ARG + nArgs + 5
+            yield "@R13"
+            yield "D=M"
+            yield "@LCL"
+            yield "M=D"
+
+        # SP = LCL
+        yield "@LCL"
+        yield "D=M"
+        yield "@SP"
+        yield "M=D"
+
+        yield f"@{function_name}"
+        yield "0;JMP"
 
     def translate(self, tokens: list[str], filename: str = None):
         match tokens:
             case ["return"]:
                 yield from self.ret()
+            case ["push" | "pop" as action, "stack", offset]:
+                yield from self.stack_push_pop(action, int(offset))
+            case ["drop", count]:
+                yield from self.drop(int(count))
             case ["push" | "pop" as action, "static", index]:
                 yield from self.static_push_pop(action, int(index), filename)
             case ["push" | "pop" as action, segment, index]:
@@ -516,21 +690,364 @@ class Translator:
                 yield from self.function(name, int(n_vars))
             case ["call", name, n_args]:
                 yield from self.call(name, int(n_args))
+            case ["tail-call", name, n_args, caller_args]:
+                yield from self.tail_call(name, int(n_args), int(caller_args))
             case _:
                 raise Exception(f"WTF is {tokens}")
 
 
-if __name__ == "__main__":
-    import sys
-
-    program_folder = Path(sys.argv[1])
-    assert program_folder.is_dir()
-    asm_file = program_folder / (program_folder.name + ".asm")
+def write_program(
+    commands: Iterable[tuple[list[str], str]],
+    write: Callable[[str], None],
+    bootstrap: bool = True,
+):
+    """
+    translate commands one by one, and hand every line of assembly
+    to `write` as soon as it's produced, nothing is kept in memory
+    """
     translator = Translator()
-    with open(asm_file, "wt+") as out:
+    if bootstrap:
         for code in translator.bootstrap():
-            out.write(code + "\n")
+            write(code)
+
+    for tokens, filename in commands:
+        for code in translator.translate(tokens, filename):
+            write(code)
+    for code in translator.routines():
+        write(code)
+
+
+class Inliner:
+    """
+    inline small leaf functions (functions which call nothing)
+    at their call sites in loops, saving the ~100 cycles of `call` and `return`.
+    a call which runs once isn't worth the ROM: inlining every call site of
+    the OS tests saves 0.0-0.8% of their cycles, a loop which only calls a
+    one line function runs in 38% fewer
+
+    call Foo.max 2      push constant 0     // locals of Foo.max
+                        ...                 // body of Foo.max, where
+                =>      push stack 3        // argument/local i becomes
+                        ...                 // a fixed distance from SP
+                        label Foo.max$inline.7.end
+
+    after the args pushed by the caller, the frame of an inlined function is
+
+        args | locals | THIS THAT (saved only if the body sets pointer) | stack
+
+    the distance between SP and each slot is known at compile time,
+    as long as the depth of the stack is the same on every path to a command
+    """
+
+    binary = ["add", "sub", "and", "or", "eq", "lt", "gt"]
+    unary = ["neg", "not"]
+
+    def __init__(self, max_size: int = 16, rom_budget: int = 2048):
+        """
+        Args:
+            max_size (int): only inline functions up to this many vm commands
+            rom_budget (int): the most instructions inlining may add to the ROM
+        """
+        self.max_size = max_size
+        self.rom_budget = rom_budget
+        self.growth = 0
+        self.sites = 0
+
+    def functions(self, commands: list):
+        """
+        yield name, n_vars and body of every function
+        """
+        for i, (tokens, _) in enumerate(commands):
+            if tokens[0] != "function":
+                continue
+            end = i + 1
+            while end < len(commands) and commands[end][0][0] != "function":
+                end += 1
+            yield tokens[1], int(tokens[2]), commands[i + 1 : end]
+
+    def depths(self, body: list):
+        """
+        the depth of stack (relative to the function entry) before each command,
+        None for unreachable commands
+
+        return None if the function can't be inlined:
+        it calls, pops below its entry, falls through, or jumps away
+        """
+        labels = {
+            tokens[1]: i for i, (tokens, _) in enumerate(body) if tokens[0] == "label"
+        }
+        depths = [None] * len(body)
+        todo = [(0, 0)]
+        while todo:
+            i, depth = todo.pop()
+            if i >= len(body):
+                return None
+            if depths[i] is not None:
+                if depths[i] != depth:
+                    return None
+                continue
+            depths[i] = depth
+
+            match body[i][0]:
+                case ["push", _, _]:
+                    todo.append((i + 1, depth + 1))
+                case ["pop", _, _]:
+                    if depth < 1:
+                        return None
+                    todo.append((i + 1, depth - 1))
+                case [operator] if operator in self.unary:
+                    if depth < 1:
+                        return None
+                    todo.append((i + 1, depth))
+                case [operator] if operator in self.binary:
+                    if depth < 2:
+                        return None
+                    todo.append((i + 1, depth - 1))
+                case ["label", _]:
+                    todo.append((i + 1, depth))
+                case ["goto" | "if-goto" as command, label]:
+                    if label not in labels:
+                        return None
+                    if command == "if-goto":
+                        if depth < 1:
+                            return None
+                        depth -= 1
+                        todo.append((i + 1, depth))
+                    todo.append((labels[label], depth))
+                case ["return"]:
+                    if depth < 1:
+                        return None
+                case _:
+                    return None
+        return depths
+
+    def expand(self, name: str, n_args: int, n_vars: int, body: list, depths: list):
+        """
+        the body of function `name`, rewritten for a call site with `n_args` args
+        """
+        site = self.sites
+        end = f"{name}$inline.{site}.end"
+        saves = any(tokens[:2] == ["pop", "pointer"] for tokens, _ in body)
+        base = n_args + n_vars + (2 if saves else 0)
+        last = max(i for i, depth in enumerate(depths) if depth is not None)
+        filename = body[0][1]
+
+        code = [(["push", "constant", "0"], filename)] * n_vars
+        if saves:
+            code.append((["push", "pointer", "0"], filename))
+            code.append((["push", "pointer", "1"], filename))
+
+        for i, ((tokens, filename), depth) in enumerate(zip(body, depths)):
+            if depth is None:
+                continue
+            # the args pushed by the caller are at depth 0..n_args-1
+            depth += base
+            match tokens:
+                case ["push", "argument", index]:
+                    tokens = ["push", "stack", str(depth - int(index))]
+                case ["pop", "argument", index]:
+                    tokens = ["pop", "stack", str(depth - 1 - int(index))]
+                case ["push", "local", index]:
+                    tokens = ["push", "stack", str(depth - n_args - int(index))]
+                case ["pop", "local", index]:
+                    tokens = ["pop", "stack", str(depth - 1 - n_args - int(index))]
+                case ["label" | "goto" | "if-goto" as command, label]:
+                    tokens = [command, f"{label}$inline.{site}"]
+                case ["return"]:
+                    if saves:
+                        for pointer in [0, 1]:
+                            offset = depth - (n_args + n_vars + pointer)
+                            code.append((["push", "stack", str(offset)], filename))
+                            code.append((["pop", "pointer", str(pointer)], filename))
+                    # *ARG = pop(); SP = ARG + 1
+                    if depth > 1:
+                        code.append((["pop", "stack", str(depth - 1)], filename))
+                    if depth > 2:
+                        code.append((["drop", str(depth - 2)], filename))
+                    if i != last:
+                        code.append((["goto", end], filename))
+                    continue
+            code.append((tokens, filename))
+
+        code.append((["label", end], filename))
+        return code
+
+    def loops(self, commands: list) -> set[int]:
+        """
+        indexes of the commands in a loop: from a label to a jump back to it,
+        in the same function
+        """
+        inside = set()
+        labels = {}
+        for i, (tokens, _) in enumerate(commands):
+            match tokens:
+                case ["function", *_]:
+                    labels = {}
+                case ["label", label]:
+                    labels[label] = i
+                case ["goto" | "if-goto", label] if label in labels:
+                    inside.update(range(labels[label], i))
+        return inside
+
+    def cost(self, commands: list) -> int:
+        """
+        how many instructions the commands are translated to.
+        on scratch tables, static addresses and label names are given out
+        by the real translation, in program order
+        """
+        global increment_table
+        saved = increment_table, Label.count
+        increment_table, Label.count = IncrementTable(), defaultdict(int)
+        try:
+            translator = Translator()
+            return sum(
+                not code.startswith("(")
+                for tokens, filename in commands
+                for code in translator.translate(tokens, filename)
+            )
+        finally:
+            increment_table, Label.count = saved
+
+    def inline(self, commands: Iterable[tuple[list[str], str]]):
+        """
+        take the (tokens, filename) of a whole program,
+        return them with the small leaf functions inlined
+        """
+        commands = list(commands)
+
+        leaves = {}
+        for name, n_vars, body in self.functions(commands):
+            if not 0 < len(body) <= self.max_size:
+                continue
+            depths = self.depths(body)
+            if depths is None:
+                continue
+            reachable = [
+                tokens for (tokens, _), depth in zip(body, depths) if depth is not None
+            ]
+            indexes = lambda segment: [
+                int(tokens[2]) for tokens in reachable if tokens[1:2] == [segment]
+            ]
+            if any(index >= n_vars for index in indexes("local")):
+                continue
+            leaves[name] = n_vars, body, depths, max(indexes("argument"), default=-1)
+
+        loops = self.loops(commands)
+        called = defaultdict(int)
+        inlined = defaultdict(int)
+        result = []
+        for i, (tokens, filename) in enumerate(commands):
+            match tokens:
+                case ["call", name, n_args] if name in leaves:
+                    called[name] += 1
+                    n_vars, body, depths, max_argument = leaves[name]
+                    if i in loops and max_argument < int(n_args):
+                        code = self.expand(name, int(n_args), n_vars, body, depths)
+                        growth = self.cost(code) - self.cost([(tokens, filename)])
+                        if self.growth + growth <= self.rom_budget:
+                            self.growth += growth
+                            self.sites += 1
+                            inlined[name] += 1
+                            result.extend(code)
+                            continue
+            result.append((tokens, filename))
+
+        # functions inlined at every call site are dead code now
+        dead = {name for name in inlined if inlined[name] == called[name]}
+        owner = None
+        alive = []
+        for tokens, filename in result:
+            if tokens[0] == "function":
+                owner = tokens[1]
+            if owner not in dead:
+                alive.append((tokens, filename))
+        return alive
+
+
+class TailCalls:
+    """
+    turn every `call f n` followed by `return` into a `tail-call`,
+    see `Translator.tail_call`
+
+    a function doesn't declare its number of args, so it is learned
+    from the call sites. only when every call site agrees on it
+    and the tail call passes no more args than that, the frame can be reused
+    """
+
+    def optimize(self, commands: Iterable[tuple[list[str], str]]):
+        commands = list(commands)
+
+        n_args = defaultdict(set)
+        # called by bootstrap
+        n_args["Sys.init"].add(0)
+        for tokens, _ in commands:
+            if tokens[0] == "call":
+                n_args[tokens[1]].add(int(tokens[2]))
+
+        result = []
+        caller = None
+        for i, (tokens, filename) in enumerate(commands):
+            is_tail = i + 1 < len(commands) and commands[i + 1][0] == ["return"]
+            match tokens:
+                case ["function", name, _]:
+                    caller = name
+                case ["return"] if result and result[-1][0][0] == "tail-call":
+                    # the callee returns to our caller, it's dead code
+                    continue
+                case ["call", name, n] if is_tail and len(n_args[caller]) == 1:
+                    (caller_args,) = n_args[caller]
+                    if int(n) <= caller_args:
+                        tokens = ["tail-call", name, n, str(caller_args)]
+            result.append((tokens, filename))
+        return result
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
 
-        for tokens, filename in Parser(program_folder).commands():
-            for code in translator.translate(tokens, filename):
-                out.write(code + "\n")
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "program_folder", help="a folder of .vm files, or - to read from stdin"
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="default: <folder>/<folder>.asm, or stdout when reading from stdin",
+    )
+    parser.add_argument(
+        "--name", help="filename of static variables from stdin (default: the class)"
+    )
+    parser.add_argument("--no-bootstrap", action="store_true")
+    parser.add_argument(
+        "--inline", action="store_true", help="inline small leaf functions"
+    )
+    parser.add_argument("--inline-size", type=int, default=16)
+    parser.add_argument("--rom-budget", type=int, default=2048)
+    parser.add_argument(
+        "--tail-calls", action="store_true", help="reuse the frame for tail calls"
+    )
+    args = parser.parse_args()
+
+    if args.program_folder == "-":
+        commands = Parser().stream(sys.stdin, args.name)
+        output = args.output or "-"
+    else:
+        program_folder = Path(args.program_folder).resolve()
+        assert program_folder.is_dir()
+        commands = Parser(program_folder).commands()
+        output = args.output or program_folder / (program_folder.name + ".asm")
+
+    # both passes need the whole program, so they hold it in memory
+    if args.inline:
+        inliner = Inliner(args.inline_size, args.rom_budget)
+        commands = inliner.inline(commands)
+    if args.tail_calls:
+        commands = TailCalls().optimize(commands)
+
+    if output == "-":
+        write_program(commands, print, not args.no_bootstrap)
+    else:
+        with open(output, "wt+") as out:
+            write = lambda code: out.write(code + "\n")
+            write_program(commands, write, not args.no_bootstrap)
@@ -0,0 +1,200 @@
+"""
+reference
+
+see 10.2.1 Lexical Elements
+see 10.5 Project, Tokenizer
+
+one compiled regex, tried at every position of the source.
+the name of the group which matched is the type of the token.
+
+the source is memory-mapped, so a file of any size is tokenized lazily,
+page by page, without being read into memory.
+"""
+
+import mmap
+import re
+from os import PathLike
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+KEYWORDS = {
+    "class",
+    "constructor",
+    "function",
+    "method",
+    "field",
+    "static",
+    "var",
+    "int",
+    "char",
+    "boolean",
+    "void",
+    "true",
+    "false",
+    "null",
+    "this",
+    "let",
+    "do",
+    "if",
+    "else",
+    "while",
+    "return",
+}
+
+# an unterminated comment or string matches till the end,
+# so a streamed source can wait for the rest of it
+MASTER = re.compile(
+    rb"""
+    (?P<comment>//[^\n]*|/\*(?:.*?\*/|.*))
+    |(?P<space>\s+)
+    |(?P<symbol>[{}()\[\].,;+\-*/&|<>=~])
+    |(?P<integerConstant>\d+)
+    |(?P<stringConstant>"[^"\n]*"?)
+    |(?P<identifier>[A-Za-z_]\w*)
+    |(?P<error>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+SKIP = {"comment", "space"}
+
+
+class TokenError(Exception):
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        # where in the scanned bytes
+        self.offset = offset
+
+
+Token = tuple[str, str]
+
+
+def scan(source: bytes, final: bool = True) -> Iterator[Token]:
+    """
+    yield (type, value) of tokens in `source`
+
+    if not `final`, the last token may continue in the next chunk,
+    so it's not yielded. return where the next chunk continues from
+    """
+    keywords = KEYWORDS
+    position = 0
+    for match in MASTER.finditer(source):
+        if not final and match.end() == len(source):
+            break
+        position = match.end()
+
+        kind = match.lastgroup
+        if kind in SKIP:
+            text = match[0]
+            if text.startswith(b"/*") and (len(text) < 4 or not text.endswith(b"*/")):
+                raise TokenError(
+                    f"unterminated comment at {match.start()}", match.start()
+                )
+            continue
+        value = match[0].decode()
+        match kind:
+            case "identifier":
+                yield ("keyword" if value in keywords else "identifier", value)
+            case "integerConstant":
+                if int(value) > 32767:
+                    raise TokenError(f"{value} is out of range 0..32767", match.start())
+                yield kind, value
+            case "stringConstant":
+                if len(value) < 2 or not value.endswith('"'):
+                    raise TokenError(f"unterminated string {value}", match.start())
+                yield kind, value[1:-1]
+            case "error":
+                raise TokenError(
+                    f"unexpected {value!r} at {match.start()}", match.start()
+                )
+            case _:
+                yield kind, value
+    return position
+
+
+def tokenize(jack_file: PathLike) -> Iterator[Token]:
+    """
+    tokens of a .jack file, read through mmap
+    """
+    with open(jack_file, "rb") as source:
+        if source.seek(0, 2) == 0:
+            return
+        with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield from scan(mapped)
+
+
+def tokenize_stream(chunks: Iterable[bytes]) -> Iterator[Token]:
+    """
+    tokens of a source coming in chunks, e.g. `iter(partial(stdin.read, 65536), b"")`.
+    a token or comment split between chunks is kept until the rest arrives
+    """
+    rest = b""
+    for chunk in chunks:
+        rest += chunk
+        consumed = yield from scan(rest, final=False)
+        rest = rest[consumed:]
+    yield from scan(rest)
+
+
+def escape(value: str) -> str:
+    return (
+        value.replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+        .replace('"', "&quot;")
+    )
+
+
+def write_xml(tokens: Iterable[Token], write: Callable[[str], object]):
+    """
+    <tokens>
+    <keyword> class </keyword>
+    ...
+    </tokens>
+    """
+    write("<tokens>\n")
+    for kind, value in tokens:
+        write(f"<{kind}> {escape(value)} </{kind}>\n")
+    write("</tokens>\n")
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="tokenize .jack files into XxxT.xml")
+    parser.add_argument(
+        "source", type=Path, help="a .jack file, a folder of them, or - for stdin"
+    )
+    parser.add_argument("-o", "--output", type=Path, default=Path("."))
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="compare with the XxxT.xml next to each .jack file instead of writing",
+    )
+    args = parser.parse_args()
+
+    source = args.source
+    if str(source) == "-":
+        chunks = iter(lambda: sys.stdin.buffer.read(65536), b"")
+        write_xml(tokenize_stream(chunks), sys.stdout.write)
+        sys.exit()
+
+    jack_files = sorted(source.glob("*.jack")) if source.is_dir() else [source]
+
+    failed = 0
+    for jack_file in jack_files:
+        xml_name = jack_file.stem + "T.xml"
+        if args.compare:
+            lines = []
+            write_xml(tokenize(jack_file), lines.append)
+            # the fixtures end lines with CRLF
+            actual = "".join(lines).replace("\n", "\r\n").encode()
+            expected = (jack_file.parent / xml_name).read_bytes()
+            status = "ok" if actual == expected else "FAIL"
+            failed += actual != expected
+            print(f"{status:<4} {jack_file}")
+        else:
+            with open(args.output / xml_name, "wt", newline="\r\n") as out:
+                write_xml(tokenize(jack_file), out.write)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,486 @@
+"""
+reference
+
+see 11.1 Code Generation
+see 11.5 Project, Compiler
+
+jack tokens -> recursive descent -> vm commands
+
+a class only refers to other classes by name, so every .jack file
+is compiled on its own, and a whole program is compiled on a process pool
+"""
+
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from os import PathLike
+from pathlib import Path
+from typing import Iterable, Iterator
+
+ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(ROOT / "10 Compiler I: Syntax Analysis"))
+
+from jack_tokenizer import Token, TokenError, tokenize
+
+# kind of variable -> vm segment
+SEGMENTS = {
+    "static": "static",
+    "field": "this",
+    "argument": "argument",
+    "local": "local",
+}
+
+OPERATORS = {
+    "+": ["add"],
+    "-": ["sub"],
+    "*": ["call", "Math.multiply", "2"],
+    "/": ["call", "Math.divide", "2"],
+    "&": ["and"],
+    "|": ["or"],
+    "<": ["lt"],
+    ">": ["gt"],
+    "=": ["eq"],
+}
+
+UNARY = {"-": ["neg"], "~": ["not"]}
+
+
+class CompileError(Exception):
+    pass
+
+
+class SymbolTable:
+    """
+    class scope: static, field
+    subroutine scope: argument, local
+    """
+
+    def __init__(self):
+        self.class_scope = {}
+        self.subroutine_scope = {}
+        self.counts = dict.fromkeys(SEGMENTS, 0)
+
+    def start_subroutine(self):
+        self.subroutine_scope = {}
+        self.counts["argument"] = 0
+        self.counts["local"] = 0
+
+    def define(self, name: str, type_: str, kind: str):
+        if kind in ["static", "field"]:
+            scope = self.class_scope
+        else:
+            scope = self.subroutine_scope
+        if name in scope:
+            raise CompileError(f"{name} is defined twice")
+        scope[name] = (type_, kind, self.counts[kind])
+        self.counts[kind] += 1
+
+    def lookup(self, name: str):
+        """
+        (type, kind, index) of a variable, None if it's not a variable
+        """
+        return self.subroutine_scope.get(name) or self.class_scope.get(name)
+
+
+class Compiler:
+    def __init__(self, tokens: Iterable[Token]):
+        self.tokens = iter(tokens)
+        self.token = next(self.tokens, (None, None))
+        self.symbols = SymbolTable()
+        self.class_name = None
+        self.subroutine_name = None
+        self.labels = 0
+
+    # tokens
+
+    def advance(self) -> str:
+        value = self.token[1]
+        self.token = next(self.tokens, (None, None))
+        return value
+
+    def peek(self, *values: str) -> bool:
+        return self.token[1] in values and self.token[0] in ["keyword", "symbol"]
+
+    def expect(self, *values: str) -> str:
+        if not self.peek(*values):
+            raise self.error(" or ".join(values))
+        return self.advance()
+
+    def name(self) -> str:
+        if self.token[0] != "identifier":
+            raise self.error("a name")
+        return self.advance()
+
+    def type_(self) -> str:
+        if self.peek("int", "char", "boolean"):
+            return self.advance()
+        return self.name()
+
+    def error(self, expected: str) -> CompileError:
+        where = ".".join(filter(None, [self.class_name, self.subroutine_name]))
+        return CompileError(f"{where}: expect {expected}, got {self.token[1]!r}")
+
+    def label(self, name: str) -> str:
+        label = f"{name}{self.labels}"
+        self.labels += 1
+        return label
+
+    # program structure
+
+    def compile_class(self) -> list[list[str]]:
+        """
+        class Name { classVarDec* subroutineDec* }
+        """
+        self.expect("class")
+        self.class_name = self.name()
+        self.expect("{")
+        while self.peek("static", "field"):
+            kind = self.advance()
+            type_ = self.type_()
+            self.symbols.define(self.name(), type_, kind)
+            while self.peek(","):
+                self.advance()
+                self.symbols.define(self.name(), type_, kind)
+            self.expect(";")
+
+        code = []
+        while self.peek("constructor", "function", "method"):
+            code += self.compile_subroutine()
+        self.expect("}")
+        if self.token[0] is not None:
+            raise self.error("end of file")
+        return code
+
+    def compile_subroutine(self) -> list[list[str]]:
+        kind = self.advance()
+        if not self.peek("void"):
+            self.type_()
+        else:
+            self.advance()
+        self.subroutine_name = self.name()
+        self.symbols.start_subroutine()
+        self.labels = 0
+        if kind == "method":
+            self.symbols.define("this", self.class_name, "argument")
+
+        self.expect("(")
+        if not self.peek(")"):
+            self.compile_parameter()
+            while self.peek(","):
+                self.advance()
+                self.compile_parameter()
+        self.expect(")")
+
+        self.expect("{")
+        while self.peek("var"):
+            self.advance()
+            type_ = self.type_()
+            self.symbols.define(self.name(), type_, "local")
+            while self.peek(","):
+                self.advance()
+                self.symbols.define(self.name(), type_, "local")
+            self.expect(";")
+
+        name = f"{self.class_name}.{self.subroutine_name}"
+        code = [["function", name, str(self.symbols.counts["local"])]]
+        match kind:
+            case "constructor":
+                fields = self.symbols.counts["field"]
+                code += [
+                    ["push", "constant", str(fields)],
+                    ["call", "Memory.alloc", "1"],
+                    ["pop", "pointer", "0"],
+                ]
+            case "method":
+                code += [["push", "argument", "0"], ["pop", "pointer", "0"]]
+        code += self.compile_statements()
+        self.expect("}")
+        self.subroutine_name = None
+        return code
+
+    def compile_parameter(self):
+        type_ = self.type_()
+        self.symbols.define(self.name(), type_, "argument")
+
+    # statements
+
+    def compile_statements(self) -> list[list[str]]:
+        code = []
+        while True:
+            match self.token[1] if self.token[0] == "keyword" else None:
+                case "let":
+                    code += self.compile_let()
+                case "if":
+                    code += self.compile_if()
+                case "while":
+                    code += self.compile_while()
+                case "do":
+                    code += self.compile_do()
+                case "return":
+                    code += self.compile_return()
+                case _:
+                    return code
+
+    def variable(self, name: str) -> list[str]:
+        symbol = self.symbols.lookup(name)
+        if symbol is None:
+            where = f"{self.class_name}.{self.subroutine_name}"
+            raise CompileError(f"{where}: {name} is undefined")
+        _, kind, index = symbol
+        return [SEGMENTS[kind], str(index)]
+
+    def compile_let(self) -> list[list[str]]:
+        """
+        let x = expr;
+        let a[i] = expr;
+        """
+        self.expect("let")
+        name = self.name()
+        target = self.variable(name)
+        if self.peek("["):
+            self.advance()
+            code = [["push", *target]] + self.compile_expression() + [["add"]]
+            self.expect("]")
+            self.expect("=")
+            code += self.compile_expression()
+            # the value may use `that` too, so set it after computing the value
+            code += [
+                ["pop", "temp", "0"],
+                ["pop", "pointer", "1"],
+                ["push", "temp", "0"],
+                ["pop", "that", "0"],
+            ]
+        else:
+            self.expect("=")
+            code = self.compile_expression() + [["pop", *target]]
+        self.expect(";")
+        return code
+
+    def compile_if(self) -> list[list[str]]:
+        """
+            cond
+            not
+            if-goto IF_FALSE
+            statements
+            goto IF_END
+        label IF_FALSE
+            else statements
+        label IF_END
+        """
+        self.expect("if")
+        self.expect("(")
+        code = self.compile_expression()
+        self.expect(")")
+        self.expect("{")
+        statements = self.compile_statements()
+        self.expect("}")
+
+        if_false = self.label("IF_FALSE")
+        code += [["not"], ["if-goto", if_false]] + statements
+        if self.peek("else"):
+            self.advance()
+            self.expect("{")
+            statements = self.compile_statements()
+            self.expect("}")
+            if_end = self.label("IF_END")
+            code += [["goto", if_end], ["label", if_false]] + statements
+            code += [["label", if_end]]
+        else:
+            code += [["label", if_false]]
+        return code
+
+    def compile_while(self) -> list[list[str]]:
+        """
+        label WHILE_EXP
+            cond
+            not
+            if-goto WHILE_END
+            statements
+            goto WHILE_EXP
+        label WHILE_END
+        """
+        self.expect("while")
+        while_exp = self.label("WHILE_EXP")
+        while_end = self.label("WHILE_END")
+        self.expect("(")
+        code = [["label", while_exp]] + self.compile_expression()
+        self.expect(")")
+        self.expect("{")
+        code += [["not"], ["if-goto", while_end]] + self.compile_statements()
+        self.expect("}")
+        code += [["goto", while_exp], ["label", while_end]]
+        return code
+
+    def compile_do(self) -> list[list[str]]:
+        self.expect("do")
+        code = self.compile_call(self.name())
+        self.expect(";")
+        # drop the return value
+        return code + [["pop", "temp", "0"]]
+
+    def compile_return(self) -> list[list[str]]:
+        self.expect("return")
+        if self.peek(";"):
+            code = [["push", "constant", "0"]]
+        else:
+            code = self.compile_expression()
+        self.expect(";")
+        return code + [["return"]]
+
+    # expressions
+
+    def compile_expression(self) -> list[list[str]]:
+        """
+        term (op term)*, no precedence, from left to right
+        """
+        code = self.compile_term()
+        while self.peek(*OPERATORS):
+            operator = self.advance()
+            code += self.compile_term() + [OPERATORS[operator]]
+        return code
+
+    def compile_term(self) -> list[list[str]]:
+        kind, value = self.token
+        match kind:
+            case "integerConstant":
+                self.advance()
+                return [["push", "constant", value]]
+            case "stringConstant":
+                self.advance()
+                code = [
+                    ["push", "constant", str(len(value))],
+                    ["call", "String.new", "1"],
+                ]
+                for char in value:
+                    code += [["push", "constant", str(ord(char))]]
+                    code += [["call", "String.appendChar", "2"]]
+                return code
+            case "keyword":
+                self.advance()
+                match value:
+                    case "true":
+                        return [["push", "constant", "0"], ["not"]]
+                    case "false" | "null":
+                        return [["push", "constant", "0"]]
+                    case "this":
+                        return [["push", "pointer", "0"]]
+                raise CompileError(f"unexpected keyword {value}")
+            case "symbol" if value == "(":
+                self.advance()
+                code = self.compile_expression()
+                self.expect(")")
+                return code
+            case "symbol" if value in UNARY:
+                self.advance()
+                return self.compile_term() + [UNARY[value]]
+            case "identifier":
+                name = self.advance()
+                if self.peek("["):
+                    self.advance()
+                    code = [["push", *self.variable(name)]] + self.compile_expression()
+                    self.expect("]")
+                    code += [["add"], ["pop", "pointer", "1"], ["push", "that", "0"]]
+                    return code
+                if self.peek("(", "."):
+                    return self.compile_call(name)
+                return [["push", *self.variable(name)]]
+        raise self.error("a term")
+
+    def compile_call(self, name: str) -> list[list[str]]:
+        """
+        f(args)         a method of this class
+        x.f(args)       a method of variable x
+        Foo.f(args)     a function or constructor of class Foo
+        """
+        if self.peek("."):
+            self.advance()
+            subroutine = self.name()
+            symbol = self.symbols.lookup(name)
+            if symbol is None:
+                code, n_args, function = [], 0, f"{name}.{subroutine}"
+            else:
+                type_, kind, index = symbol
+                code = [["push", SEGMENTS[kind], str(index)]]
+                n_args, function = 1, f"{type_}.{subroutine}"
+        else:
+            code = [["push", "pointer", "0"]]
+            n_args, function = 1, f"{self.class_name}.{name}"
+
+        self.expect("(")
+        if not self.peek(")"):
+            code += self.compile_expression()
+            n_args += 1
+            while self.peek(","):
+                self.advance()
+                code += self.compile_expression()
+                n_args += 1
+        self.expect(")")
+        return code + [["call", function, str(n_args)]]
+
+
+def compile_class(tokens: Iterable[Token]) -> list[list[str]]:
+    """
+    vm commands of one class, every command is a list of tokens
+    """
+    return Compiler(tokens).compile_class()
+
+
+def token_error(jack_file: PathLike, error: TokenError) -> CompileError:
+    """
+    a TokenError as a CompileError, with the line of the bad token
+    """
+    with open(jack_file, "rb") as source:
+        line = source.read(error.offset).count(b"\n") + 1
+    return CompileError(f"{jack_file}:{line}: {error}")
+
+
+def compile_file(jack_file: PathLike, out_dir: PathLike = None) -> Path:
+    """
+    Foo.jack -> Foo.vm, next to it or in `out_dir`
+    """
+    jack_file = Path(jack_file)
+    vm_file = Path(out_dir or jack_file.parent) / jack_file.with_suffix(".vm").name
+    try:
+        code = compile_class(tokenize(jack_file))
+    except CompileError as error:
+        raise CompileError(f"{jack_file}: {error}") from None
+    except TokenError as error:
+        raise token_error(jack_file, error) from None
+    with open(vm_file, "wt") as out:
+        for command in code:
+            out.write(" ".join(command) + "\n")
+    return vm_file
+
+
+def jack_files(sources: Iterable[PathLike]) -> Iterator[Path]:
+    for source in map(Path, sources):
+        if source.is_dir():
+            yield from sorted(source.glob("*.jack"))
+        else:
+            yield source
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="compile .jack files into .vm")
+    parser.add_argument("sources", type=Path, nargs="+", help=".jack files or folders")
+    parser.add_argument("-o", "--output", type=Path, help="write .vm files here")
+    parser.add_argument("-j", "--jobs", type=int, help="processes, all cpus by default")
+    args = parser.parse_args()
+
+    files = list(jack_files(args.sources))
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.jobs) as pool:
+        futures = [pool.submit(compile_file, file, args.output) for file in files]
+        failed = 0
+        for file, future in zip(files, futures):
+            try:
+                print(future.result())
+            except CompileError as error:
+                print(f"error: {error}", file=sys.stderr)
+                failed += 1
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{len(files) - failed} of {len(files)} classes in {elapsed:.1f}ms")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,376 @@
+"""
+benchmarks of the assembler, the vm translator, the jack tokenizer
+and the hack emulator
+
+    # time every sample, save the result as a baseline
+    python benchmarks/benchmark.py run -o benchmarks/baseline.json
+
+    # later, after some changes
+    python benchmarks/benchmark.py run -o current.json
+    python benchmarks/benchmark.py compare benchmarks/baseline.json current.json
+
+every case runs in a fresh process, because
+1. the assembler and the translator keep their tables in module globals
+2. peak RSS (`ru_maxrss`) only grows, it can't be reset within a process
+"""
+
+import hashlib
+import json
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(ROOT / "06 Assembler"))
+sys.path.insert(0, str(ROOT / "08 VM II: Program Control"))
+sys.path.insert(0, str(ROOT / "10 Compiler I: Syntax Analysis"))
+sys.path.insert(0, str(ROOT / "emulator"))
+
+ASSEMBLE = sorted((ROOT / "06 Assembler").glob("*/*.asm"))
+TRANSLATE = sorted(
+    {
+        vm_file.parent
+        for chapter in ["07 VM I: Stack Arithmetic", "08 VM II: Program Control"]
+        for vm_file in (ROOT / chapter).glob("*/*/*.vm")
+    }
+)
+TOKENIZE = sorted((ROOT / "10 Compiler I: Syntax Analysis").glob("*/*.jack"))
+# programs which run for a long time (polling the keyboard forever)
+EXECUTE = [ROOT / "06 Assembler/pong/Pong.asm"]
+# and played with a key script, see emulator/keyboard.py. both run --cycles,
+# which has to cover the script: Pong draws its first frame after about 5M
+PLAY = [(ROOT / "06 Assembler/pong/Pong.asm", ROOT / "benchmarks/pong.keys")]
+
+
+def count_lines(path: Path) -> int:
+    with open(path, "rt") as file:
+        return sum(1 for _ in file)
+
+
+def synthetic_asm(path: Path, lines: int):
+    """
+    a big, valid program which looks like the output of the vm translator:
+    labels, variables, constants and every form of c-instruction
+    """
+    block = [
+        "// block {i}",
+        "@var{v}",
+        "D=M",
+        "@LOOP.{i}",
+        "D;JGT",
+        "(LOOP.{i})",
+        "@{i}",
+        "D=D+A",
+        "",
+        "@SP",
+        "AM=M+1",
+        "A=A-1",
+        "M=D // push",
+        "@R13",
+        "MD=D-1",
+        "@LOOP.{i}",
+        "0;JMP",
+    ]
+    with open(path, "wt") as out:
+        written = 0
+        i = 0
+        while written < lines:
+            for line in block:
+                out.write(line.format(i=i % 32768, v=i % 256) + "\n")
+            written += len(block)
+            i += 1
+
+
+def synthetic_jack(path: Path, lines: int):
+    """
+    a big jack class, with every kind of token and comment
+    """
+    block = [
+        "    /** method {i}",
+        "     *  returns a mixed expression",
+        "     */",
+        "    method int method{i}(int x, boolean flag) {{",
+        "        var Array a; // a local",
+        '        let a[x] = (x * {i}) + (-x / 2) & ~flag | (x < 3) | (x > 4);',
+        '        do Output.printString("method {i}");',
+        "        while (~(x = 0)) {{ let x = x - 1; }}",
+        "        if (flag) {{ return null; }} else {{ return this; }}",
+        "    }}",
+        "",
+    ]
+    with open(path, "wt") as out:
+        out.write("class Synthetic {\n")
+        written = 1
+        i = 0
+        while written < lines:
+            for line in block:
+                out.write(line.format(i=i % 32768) + "\n")
+            written += len(block)
+            i += 1
+        out.write("}\n")
+
+
+def assemble_case(asm_file: str, out_dir: str) -> dict:
+    from assembler import Code, Parser
+
+    hack_file = Path(out_dir) / Path(asm_file).with_suffix(".hack").name
+    start = time.perf_counter()
+    with open(hack_file, "wt") as out:
+        for ins in Parser(asm_file).instructions():
+            out.write(Code.encode(ins) + "\n")
+    seconds = time.perf_counter() - start
+
+    return {
+        "unit": "lines",
+        "count": count_lines(Path(asm_file)),
+        "seconds": seconds,
+        "output_bytes": hack_file.stat().st_size,
+    }
+
+
+def assemble_low_memory_case(asm_file: str, out_dir: str) -> dict:
+    from assembler import Parser
+
+    hack_file = Path(out_dir) / Path(asm_file).with_suffix(".hack").name
+    start = time.perf_counter()
+    with open(hack_file, "wt") as out:
+        out.writelines(bits + "\n" for bits in Parser(asm_file).machine_code())
+    seconds = time.perf_counter() - start
+
+    return {
+        "unit": "lines",
+        "count": count_lines(Path(asm_file)),
+        "seconds": seconds,
+        "output_bytes": hack_file.stat().st_size,
+    }
+
+
+def translate_case(program_folder: str, out_dir: str) -> dict:
+    from vm_translator import Parser, Translator
+
+    asm_file = Path(out_dir) / (Path(program_folder).name + ".asm")
+    translator = Translator()
+    start = time.perf_counter()
+    with open(asm_file, "wt") as out:
+        for code in translator.bootstrap():
+            out.write(code + "\n")
+
+        for tokens, filename in Parser(program_folder).commands():
+            for code in translator.translate(tokens, filename):
+                out.write(code + "\n")
+        for code in translator.routines():
+            out.write(code + "\n")
+    seconds = time.perf_counter() - start
+
+    return {
+        "unit": "lines",
+        "count": sum(map(count_lines, Path(program_folder).glob("*.vm"))),
+        "seconds": seconds,
+        "output_bytes": asm_file.stat().st_size,
+    }
+
+
+def tokenize_case(jack_file: str, out_dir: str) -> dict:
+    from jack_tokenizer import tokenize, write_xml
+
+    xml_file = Path(out_dir) / (Path(jack_file).stem + "T.xml")
+    start = time.perf_counter()
+    with open(xml_file, "wt", newline="\r\n") as out:
+        write_xml(tokenize(jack_file), out.write)
+    seconds = time.perf_counter() - start
+
+    return {
+        "unit": "lines",
+        "count": count_lines(Path(jack_file)),
+        "seconds": seconds,
+        "output_bytes": xml_file.stat().st_size,
+    }
+
+
+def execute_case(asm_file: str, cycles: int, key_script: str = None) -> dict:
+    from assembler import Code, Parser
+    from hack_machine import Machine
+    from keyboard import Keyboard, read
+    from screen import frame
+
+    rom = [int(Code.encode(ins), 2) for ins in Parser(asm_file).instructions()]
+    machine = Machine(rom)
+    run = machine.run
+    if key_script:
+        keyboard = Keyboard(read(key_script))
+        run = lambda cycles: keyboard.run(machine, cycles)
+
+    start = time.perf_counter()
+    executed = run(cycles)
+    seconds = time.perf_counter() - start
+
+    return {
+        "unit": "cycles",
+        "count": executed,
+        "seconds": seconds,
+        "output_bytes": 0,
+        "screen": hashlib.sha1(frame(machine.ram)).hexdigest(),
+    }
+
+
+def measure(case, *args) -> dict:
+    """
+    runs in the child process
+    """
+    record = case(*args)
+    # kilobytes on linux
+    record["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return record
+
+
+def run(sizes: list[int], repeat: int, cycles: int, huge: int) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as out_dir:
+        cases = []
+        for asm_file in ASSEMBLE:
+            name = asm_file.relative_to(ROOT)
+            cases.append((f"assemble:{name}", assemble_case, str(asm_file), out_dir))
+        for lines in sizes:
+            asm_file = Path(out_dir) / f"Synthetic{lines}.asm"
+            synthetic_asm(asm_file, lines)
+            name = f"synthetic-{lines}"
+            cases.append((f"assemble:{name}", assemble_case, str(asm_file), out_dir))
+            case = assemble_low_memory_case
+            cases.append((f"assemble-low-memory:{name}", case, str(asm_file), out_dir))
+        if huge:
+            # peak RSS has to stay flat however long the program is
+            asm_file = Path(out_dir) / f"Synthetic{huge}.asm"
+            synthetic_asm(asm_file, huge)
+            name = f"synthetic-{huge}"
+            case = assemble_low_memory_case
+            cases.append((f"assemble-low-memory:{name}", case, str(asm_file), out_dir))
+        for folder in TRANSLATE:
+            name = folder.relative_to(ROOT)
+            cases.append((f"translate:{name}", translate_case, str(folder), out_dir))
+        for jack_file in TOKENIZE:
+            name = jack_file.relative_to(ROOT)
+            cases.append((f"tokenize:{name}", tokenize_case, str(jack_file), out_dir))
+        for lines in sizes:
+            jack_file = Path(out_dir) / f"Synthetic{lines}.jack"
+            synthetic_jack(jack_file, lines)
+            name = f"synthetic-{lines}"
+            cases.append((f"tokenize:{name}", tokenize_case, str(jack_file), out_dir))
+        for asm_file in EXECUTE:
+            name = asm_file.relative_to(ROOT)
+            cases.append((f"execute:{name}", execute_case, str(asm_file), cycles))
+        for asm_file, key_script in PLAY:
+            name = key_script.relative_to(ROOT)
+            case = execute_case
+            cases.append((f"play:{name}", case, str(asm_file), cycles, str(key_script)))
+
+        context = get_context("spawn")
+        with ProcessPoolExecutor(1, context, max_tasks_per_child=1) as pool:
+            for name, case, *args in cases:
+                records = [
+                    pool.submit(measure, case, *args).result() for _ in range(repeat)
+                ]
+                best = min(records, key=lambda record: record["seconds"])
+                best["peak_rss_kb"] = max(r["peak_rss_kb"] for r in records)
+                best["rate"] = best["count"] / best["seconds"] if best["seconds"] else 0
+                results[name] = best
+                report(name, best)
+
+    for asm_file, key_script in PLAY:
+        # a script which misses the game measures the same as execute
+        played = results[f"play:{key_script.relative_to(ROOT)}"]
+        executed = results[f"execute:{asm_file.relative_to(ROOT)}"]
+        if played["screen"] == executed["screen"]:
+            raise RuntimeError(
+                f"{key_script.name} doesn't change the screen of {asm_file.name}"
+                f" in {cycles:,} cycles"
+            )
+
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def report(name: str, record: dict):
+    print(
+        f"{name:<72} {record['count']:>9} {record['unit']:<6}"
+        f" {record['seconds']:>8.3f}s {record['rate']:>12,.0f}/s"
+        f" {record['peak_rss_kb'] / 1024:>8.1f}MB {record['output_bytes']:>10}B"
+    )
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """
+    return the names of the cases slower than the baseline by more than
+    `threshold` (0.1 == 10% less lines or cycles per second)
+    """
+    slower = []
+    for name, old in baseline["results"].items():
+        new = current["results"].get(name)
+        if new is None:
+            print(f"{name:<72} missing")
+            continue
+
+        change = new["rate"] / old["rate"] - 1 if old["rate"] else 0
+        memory = new["peak_rss_kb"] / old["peak_rss_kb"] - 1
+        flag = ""
+        if change < -threshold:
+            flag = "SLOWER"
+            slower.append(name)
+        print(f"{name:<72} speed {change:>+7.1%} memory {memory:>+7.1%} {flag}")
+    return slower
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run all benchmarks")
+    run_parser.add_argument("-o", "--output", type=Path, help="save results as json")
+    run_parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="*",
+        default=[100_000, 1_000_000],
+        help="lines of the synthetic .asm and .jack inputs",
+    )
+    run_parser.add_argument(
+        "--huge",
+        type=int,
+        default=5_000_000,
+        help="lines of the .asm for the low memory assembler only, 0 to skip",
+    )
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--cycles", type=int, default=12_000_000)
+
+    compare_parser = commands.add_parser("compare", help="flag slowdowns")
+    compare_parser.add_argument("baseline", type=Path)
+    compare_parser.add_argument("current", type=Path)
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+
+    args = parser.parse_args()
+    match args.command:
+        case "run":
+            try:
+                results = run(args.sizes, args.repeat, args.cycles, args.huge)
+            except RuntimeError as error:
+                sys.exit(f"error: {error}")
+            if args.output:
+                with open(args.output, "wt") as out:
+                    json.dump(results, out, indent=2)
+        case "compare":
+            baseline = json.loads(args.baseline.read_text())
+            current = json.loads(args.current.read_text())
+            if compare(baseline, current, args.threshold):
+                sys.exit(1)
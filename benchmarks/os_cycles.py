@@ -0,0 +1,227 @@
+"""
+reference
+
+see 12.3 Testing the OS
+
+cycles the test programs of `12 Operating System` take on the Hack emulator,
+from Sys.init to the end of Main.main
+
+    python benchmarks/os_cycles.py
+    python benchmarks/os_cycles.py ScreenTest --profile --screen screen.png
+
+like the course tests one OS class at a time, each test is linked with the
+classes it uses only, and a small Sys which initializes them and halts.
+the halt loop of that Sys is the one the emulator detects, so the count is
+exact.
+
+RAM[8000..] is checked against the .cmp of the test where there is one,
+the screen against the screenshot of the course, <test>Output.gif, where
+there is one instead. a test with neither fails.
+
+Keyboard is not run, its test waits for keys.
+"""
+
+import sys
+from bisect import bisect
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(ROOT / "toolchain"))
+sys.path.insert(0, str(ROOT / "emulator"))
+
+import build
+from hack_machine import Machine, signed
+from screen import frame, picture_difference, read_gif
+
+TESTS = ROOT / "12 Operating System"
+
+# the OS classes of every test, in the order they are initialized
+CLASSES = {
+    "MathTest": ["Memory", "Math", "Array"],
+    "MemoryTest": ["Memory", "Math", "Array"],
+    "ArrayTest": ["Memory", "Math", "Array"],
+    "ScreenTest": ["Memory", "Math", "Array", "Screen"],
+    "OutputTest": ["Memory", "Math", "Array", "String", "Output"],
+    "StringTest": ["Memory", "Math", "Array", "String", "Output"],
+}
+
+# (left, top, width, height) of the screen in the screenshot of the tests which
+# draw, the screenshots are scaled and cropped differently
+BOXES = {
+    "ScreenTest": (6.75, 7.5, 350, 179.2),
+    "OutputTest": (6.75, 7.5, 350, 179.2),
+    "StringTest": (6.75, 8.75, 350, 183),
+}
+# pixels of a screenshot which the screen may not explain, where it blurs.
+# an empty screen leaves 1,181 of OutputTest unexplained
+PICTURE_ERRORS = 100
+
+CYCLES = 50_000_000
+
+
+def sys_commands(inits: list[str]) -> list[build.Command]:
+    """
+    Sys.init, Sys.halt and Sys.error, which keeps the code in Sys.0
+    """
+    code = [["function", "Sys.init", "0"]]
+    for init in inits:
+        code += [["call", init, "0"], ["pop", "temp", "0"]]
+    code += [
+        ["call", "Main.main", "0"],
+        ["pop", "temp", "0"],
+        ["call", "Sys.halt", "0"],
+        ["function", "Sys.halt", "0"],
+        ["label", "HALT"],
+        ["goto", "HALT"],
+        ["function", "Sys.error", "0"],
+        ["push", "argument", "0"],
+        ["pop", "static", "0"],
+        ["call", "Sys.halt", "0"],
+    ]
+    return [(tokens, "Sys") for tokens in code]
+
+
+def program(folder: Path, classes: list[str]) -> tuple[list[int], list[build.Command]]:
+    """
+    the ROM of a test, and its vm commands
+    """
+    build.reset()
+    commands = build.commands([folder])
+    inits = []
+    for name in classes:
+        code = build.class_commands(TESTS / f"{name}.jack")
+        if ["function", f"{name}.init"] in (tokens[:2] for tokens, _ in code):
+            inits.append(f"{name}.init")
+        commands += code
+    commands += sys_commands(inits)
+    build.check_calls(commands, bootstrap=True)
+    rom = [int(word, 2) for word in build.assemble(build.translate(commands))]
+    return rom, commands
+
+
+def expected(test: str) -> dict[int, int]:
+    """
+    address -> value of the .cmp of a test, empty if it has none
+    """
+    cmp_file = TESTS / test / f"{test}.cmp"
+    if not cmp_file.exists():
+        return {}
+    header, values = cmp_file.read_text().splitlines()[:2]
+    addresses = [int(field[4:-1]) for field in header.strip("|").split("|")]
+    return dict(zip(addresses, map(int, values.strip("|").split("|"))))
+
+
+def profile(machine: Machine, starts: list[int], names: list[str], cycles: int):
+    """
+    run one instruction at a time, and count the cycles of every function
+    """
+    spent = Counter()
+    while not machine.halted and machine.cycles < cycles:
+        spent[names[bisect(starts, machine.pc) - 1]] += machine.run(1)
+    return spent
+
+
+def run(
+    folder: Path, classes: list[str], cycles: int = CYCLES, profiled: bool = False
+) -> dict:
+    """
+    run a test program linked with `classes` of the OS. its results are in
+    the RAM of the machine, and on its screen
+    """
+    rom, commands = program(folder, classes)
+    functions = {
+        build.assembler.symbol_table[tokens[1]]: tokens[1]
+        for tokens, _ in commands
+        if tokens[0] == "function"
+    }
+    # the bootstrap, before the first function
+    functions.setdefault(0, "(bootstrap)")
+    # and the code every call and return shares, after the last one
+    for routine in ["$CALL", "$RETURN"]:
+        if routine in build.assembler.symbol_table:
+            functions[build.assembler.symbol_table[routine]] = routine
+    starts = sorted(functions)
+    names = [functions[start] for start in starts]
+
+    machine = Machine(rom)
+    spent = Counter()
+    if profiled:
+        spent = profile(machine, starts, names, cycles)
+    else:
+        machine.run(cycles)
+
+    translator = build.vm_translator
+    error = translator.registers["static"] + translator.increment_table.get("Sys.0")
+    return {
+        "rom": len(rom),
+        "cycles": machine.cycles,
+        "halted": machine.halted,
+        "error": machine.ram[error],
+        "screen": frame(machine.ram),
+        "profile": spent,
+        "machine": machine,
+    }
+
+
+def check(test: str, result: dict) -> str:
+    """
+    "ok", or what is wrong with the result of a course test
+    """
+    if not result["halted"]:
+        return "did not halt"
+    if result["error"]:
+        return f"Sys.error({result['error']})"
+    ram = result["machine"].ram
+    wrong = [
+        f"RAM[{address}]={signed(ram[address])} expected {value}"
+        for address, value in expected(test).items()
+        if signed(ram[address]) != value
+    ]
+    if wrong:
+        return ", ".join(wrong)
+    picture_file = TESTS / test / f"{test}Output.gif"
+    if test in BOXES:
+        differ = picture_difference(
+            result["screen"], read_gif(picture_file), BOXES[test]
+        )
+        if differ > PICTURE_ERRORS:
+            return f"screen differs from {picture_file.name} in {differ} pixels"
+    elif not expected(test):
+        return "nothing to check, no .cmp and no screenshot"
+    return "ok"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="cycles of the OS test programs")
+    parser.add_argument("tests", nargs="*", help=f"default: {' '.join(CLASSES)}")
+    parser.add_argument("--cycles", type=int, default=CYCLES, help="at most")
+    parser.add_argument(
+        "--profile", action="store_true", help="cycles of every function, slower"
+    )
+    parser.add_argument("--screen", type=Path, help="save the last screen, .png")
+    args = parser.parse_args()
+    for test in args.tests:
+        if test not in CLASSES:
+            parser.error(f"unknown test {test}, choose from {', '.join(CLASSES)}")
+
+    failed = False
+    for test in args.tests or CLASSES:
+        result = run(TESTS / test, CLASSES[test], args.cycles, args.profile)
+        status = check(test, result)
+        failed |= status != "ok"
+        print(
+            f"{test:<12} {result['cycles']:>12,} cycles"
+            f"  rom {result['rom']:>6}  {status}"
+        )
+        for name, spent in result["profile"].most_common(12):
+            print(f"    {name:<28} {spent:>12,} {spent / result['cycles']:>7.1%}")
+
+    if args.screen:
+        from screen import save
+
+        save(result["screen"], args.screen)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,256 @@
+"""
+reference
+
+see 2.2.2 The Arithmetic Logic Unit
+see 5.2.3 Central Processing Unit
+
+many Hack computers running the same ROM in lockstep, for fuzzing
+and property tests. needs NumPy.
+
+the state of machine i is a[i], d[i], pc[i] and ram[i], every step
+executes the instruction at its own pc in all of them at once. there is
+no branch per instruction type: the comp bits drive the ALU of chapter 2
+(zx nx zy ny f no) on whole vectors, and the results are kept or dropped
+by masks, so machines whose pcs diverged still step together.
+every machine has its own 64KB of RAM, 5000 machines take 320MB.
+
+    # Mult with 5000 random inputs, checked against hack_machine
+    python emulator/batch.py "04 Machine Language/mult/Mult.asm" \\
+        --machines 5000 --random 0=0:181 --random 1=0:181 --verify 20
+"""
+
+from os import PathLike
+
+import numpy as np
+
+from hack_machine import Machine, load
+
+
+# a decoded instruction, one row per ROM address, one column per field.
+# fields are masks, 0 or 0xFFFF, so choosing is `&`, `|` and `^`
+FIELDS = [
+    "word",
+    "is_c",
+    "use_m",
+    "keep_x",
+    "flip_x",
+    "keep_y",
+    "flip_y",
+    "add",
+    "flip_out",
+    "to_a",
+    "to_d",
+    "to_m",
+    "jump",
+    "halt",
+]
+
+
+def decode(rom: np.ndarray) -> np.ndarray:
+    def mask(condition):
+        return np.where(condition, 0xFFFF, 0)
+
+    def bit(n):
+        return rom & (1 << n) != 0
+
+    is_c = bit(15)
+    # (END)
+    # @END
+    # 0;JMP
+    # like Decoded.halt, the jump right after the @ of its own label
+    previous = np.concatenate(([0xFFFF], rom[:-1])).astype(np.int64)
+    halt = is_c & (rom & 0b111 == 0b111) & (previous == np.arange(len(rom)) - 1)
+
+    fields = {
+        "word": rom,
+        "is_c": mask(is_c),
+        "use_m": mask(is_c & bit(12)),
+        # the ALU control bits, zx nx zy ny f no
+        "keep_x": mask(~is_c | ~bit(11)),
+        "flip_x": mask(is_c & bit(10)),
+        "keep_y": mask(~is_c | ~bit(9)),
+        "flip_y": mask(is_c & bit(8)),
+        "add": mask(is_c & bit(7)),
+        "flip_out": mask(is_c & bit(6)),
+        "to_a": mask(is_c & bit(5)),
+        "to_d": mask(is_c & bit(4)),
+        "to_m": mask(is_c & bit(3)),
+        # j1 j2 j3: jump if out < 0, out == 0, out > 0
+        "jump": np.where(is_c, rom & 0b111, 0),
+        "halt": mask(halt),
+    }
+    columns = [fields[name] for name in FIELDS]
+    return np.ascontiguousarray(np.array(columns, dtype=np.uint16).T)
+
+
+class Batch:
+    def __init__(self, rom: list[int], machines: int):
+        self.rom = np.array(rom or [0], dtype=np.uint16)
+        self.size = len(rom)
+        self.decoded = decode(self.rom)
+        self.machines = machines
+        # RAM[i] of machine m is flat[base[m] + i]
+        self.base = np.arange(machines, dtype=np.int64) * 32768
+        self.reset()
+
+    @classmethod
+    def load(cls, program_file: PathLike, machines: int):
+        """
+        a .hack or .asm program
+        """
+        return cls(load(program_file).rom, machines)
+
+    def reset(self):
+        n = self.machines
+        self.ram = np.zeros((n, 32768), dtype=np.uint16)
+        self.flat = self.ram.reshape(-1)
+        self.a = np.zeros(n, dtype=np.uint16)
+        self.d = np.zeros(n, dtype=np.uint16)
+        # int, so `pc - 1` is -1 at 0 and never equals an A
+        self.pc = np.zeros(n, dtype=np.int64)
+        self.cycles = np.zeros(n, dtype=np.int64)
+        self.halted = np.zeros(n, dtype=bool)
+
+    def step(self) -> bool:
+        """
+        one instruction in every machine which hasn't halted,
+        return whether any is still running
+        """
+        a, d, pc = self.a, self.d, self.pc
+        inside = pc < self.size
+        at = np.minimum(pc, len(self.decoded) - 1)
+        (
+            word,
+            is_c,
+            use_m,
+            keep_x,
+            flip_x,
+            keep_y,
+            flip_y,
+            add,
+            flip_out,
+            to_a,
+            to_d,
+            to_m,
+            jump,
+            halt,
+        ) = self.decoded.take(at, axis=0).T.copy()
+
+        self.halted |= ~inside | ((halt != 0) & (a == pc - 1))
+        live = ~self.halted
+        if not live.any():
+            return False
+        # 0xFFFF for every running machine
+        running = live.astype(np.uint16) * np.uint16(0xFFFF)
+        is_c &= running
+
+        address = self.base + (a & 0x7FFF)
+        m = self.flat.take(address)
+
+        # the ALU
+        y = (m & use_m) | (a & ~use_m)
+        x = (d & keep_x) ^ flip_x
+        y = (y & keep_y) ^ flip_y
+        out = (((x + y) & add) | (x & y & ~add)) ^ flip_out
+
+        to_m &= is_c
+        write = to_m != 0
+        if write.any():
+            self.flat[address[write]] = out[write]
+        to_d &= is_c
+        self.d = (out & to_d) | (d & ~to_d)
+
+        # bit 2, 1 or 0 of jump, for out < 0, == 0, > 0
+        sign = ((out >> 15) << 1) | (out == 0)
+        taken = (jump >> sign) & 1 != 0
+        taken &= live
+        self.pc = np.where(taken, a & 0x7FFF, pc + live)
+
+        to_a &= is_c
+        load_a = running & ~is_c
+        self.a = (word & load_a) | (out & to_a) | (a & ~(load_a | to_a))
+
+        self.cycles += live
+        return True
+
+    def run(self, cycles: int) -> int:
+        """
+        execute at most `cycles` steps, stop earlier if every machine halts
+
+        return the number of steps executed
+        """
+        executed = 0
+        while executed < cycles and self.step():
+            executed += 1
+        return executed
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    import time
+
+    def inputs(text: str) -> tuple[int, int, int]:
+        # 0=0:181 -> RAM[0] in 0..180
+        address, bounds = text.split("=")
+        low, high = bounds.split(":")
+        return int(address), int(low), int(high)
+
+    parser = argparse.ArgumentParser(description="run many hack machines at once")
+    parser.add_argument("program", help=".hack or .asm")
+    parser.add_argument("--machines", type=int, default=1000)
+    parser.add_argument("--cycles", type=int, default=100_000)
+    parser.add_argument(
+        "--random",
+        type=inputs,
+        action="append",
+        default=[],
+        metavar="ADDRESS=LOW:HIGH",
+        help="random RAM[ADDRESS] in LOW..HIGH-1 for every machine",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--verify", type=int, default=0, help="rerun so many machines one by one"
+    )
+    parser.add_argument("--show", type=int, default=16, help="RAM words to print")
+    args = parser.parse_args()
+
+    batch = Batch.load(args.program, args.machines)
+    generator = np.random.default_rng(args.seed)
+    for address, low, high in args.random:
+        batch.ram[:, address] = generator.integers(low, high, args.machines) & 0xFFFF
+
+    initial = batch.ram[: args.verify, :].copy()
+    start = time.perf_counter()
+    steps = batch.run(args.cycles)
+    seconds = time.perf_counter() - start
+    total = int(batch.cycles.sum())
+    print(
+        f"{args.machines} machines, {steps} steps, {total} instructions"
+        f" in {seconds:.3f}s, {total / seconds:,.0f}/s,"
+        f" {int(batch.halted.sum())} halted"
+    )
+    if args.show:
+        for row in batch.ram[:4, : args.show]:
+            print("RAM:", row.astype(np.int16).tolist())
+
+    failed = 0
+    start = time.perf_counter()
+    for i in range(args.verify):
+        machine = Machine(batch.rom[: batch.size].tolist())
+        machine.ram = initial[i].tolist()
+        machine.run(args.cycles)
+        same = (
+            machine.ram == batch.ram[i].tolist()
+            and machine.cycles == batch.cycles[i]
+            and machine.halted == batch.halted[i]
+            and (machine.a, machine.d, machine.pc)
+            == (batch.a[i], batch.d[i], batch.pc[i])
+        )
+        if not same:
+            failed += 1
+            print(f"machine {i} differs from hack_machine")
+    if args.verify:
+        seconds = time.perf_counter() - start
+        print(f"verified {args.verify} machines one by one in {seconds:.3f}s")
+    sys.exit(1 if failed else 0)
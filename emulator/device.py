@@ -0,0 +1,238 @@
+"""
+reference
+
+see 5.2.4 Memory, Screen, Keyboard
+
+the RAM of a running Hack computer in a memory-mapped file, so other
+processes can watch its screen and press its keys while it runs.
+
+the machine reads and writes the mapped words directly, there is no copy
+per frame and no call into a viewer. a viewer maps the same file, reads
+the 8K words at SCREEN at its own rate and writes KBD. so the runner goes
+as fast with a viewer attached as without one.
+
+    # terminal 1
+    python emulator/device.py run "06 Assembler/pong/Pong.asm"
+    # terminal 2, arrow keys move the bat
+    python emulator/device.py view
+"""
+
+import mmap
+import sys
+import tempfile
+from array import array
+from os import PathLike
+from pathlib import Path
+
+from hack_machine import KBD, SCREEN, Machine
+from screen import HEIGHT, REVERSE, ROW_BYTES, WIDTH
+
+SIZE = 32768 * 2
+
+# /dev/shm is memory, not disk, where there is one
+DEFAULT = Path("/dev/shm" if Path("/dev/shm").is_dir() else tempfile.gettempdir())
+DEFAULT = DEFAULT / "hack.ram"
+
+
+class Device:
+    """
+    32K words of RAM, shared through `device_file`
+
+        device = Device("/dev/shm/hack.ram", create=True)
+        device.attach(machine)
+        machine.run(...)
+    """
+
+    def __init__(self, device_file: PathLike = DEFAULT, create: bool = False):
+        with open(device_file, "w+b" if create else "r+b") as file:
+            if create:
+                file.truncate(SIZE)
+            self.mapped = mmap.mmap(file.fileno(), SIZE)
+        self.ram = memoryview(self.mapped).cast("H")
+
+    def attach(self, machine: Machine):
+        """
+        the machine uses the shared RAM from now on, until `Machine.reset`
+        """
+        self.ram[:] = array("H", machine.ram)
+        machine.ram = self.ram
+
+    @property
+    def key(self) -> int:
+        return self.ram[KBD]
+
+    @key.setter
+    def key(self, code: int):
+        self.ram[KBD] = code
+
+    def frame(self) -> bytes:
+        """
+        like `screen.frame`, straight from the mapped bytes
+        """
+        words = self.mapped[SCREEN * 2 : KBD * 2]
+        if sys.byteorder == "big":
+            swapped = array("H", words)
+            swapped.byteswap()
+            words = swapped.tobytes()
+        return words.translate(REVERSE)
+
+    def close(self):
+        self.ram.release()
+        self.mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# a character cell of the terminal is 4 pixels wide and 8 high,
+# its upper and lower half are lit if any of their pixels is black
+HALVES = {(0, 0): " ", (1, 0): "▀", (0, 1): "▄", (1, 1): "█"}
+
+
+def text(frame: bytes) -> str:
+    """
+    the screen in 128 x 32 characters
+    """
+    rows = [
+        int.from_bytes(frame[start : start + ROW_BYTES], "big")
+        for start in range(0, len(frame), ROW_BYTES)
+    ]
+    # 4 pixel rows in one
+    bands = [
+        rows[i] | rows[i + 1] | rows[i + 2] | rows[i + 3] for i in range(0, HEIGHT, 4)
+    ]
+    lines = []
+    for upper, lower in zip(bands[::2], bands[1::2]):
+        line = []
+        for shift in range(WIDTH - 4, -1, -4):
+            cell = (upper >> shift & 0xF != 0, lower >> shift & 0xF != 0)
+            line.append(HALVES[cell])
+        lines.append("".join(line))
+    return "\n".join(lines)
+
+
+# terminal input -> Hack key codes
+ESCAPES = {
+    "\x1b[A": 131,
+    "\x1b[B": 133,
+    "\x1b[C": 132,
+    "\x1b[D": 130,
+    "\x1b[H": 134,
+    "\x1b[F": 135,
+    "\x1b[5~": 136,
+    "\x1b[6~": 137,
+    "\x1b[2~": 138,
+    "\x1b[3~": 139,
+    "\x1b": 140,
+    "\x7f": 129,
+    "\r": 128,
+    "\n": 128,
+}
+
+
+def view(device: Device, fps: float, hold: float, png_file: PathLike = None):
+    """
+    draw the screen `fps` times a second, in the terminal or into `png_file`.
+    a terminal has no key releases, so a key is held for `hold` seconds
+    after its last repeat
+    """
+    import os
+    import select
+    import time
+
+    from screen import save
+
+    interactive = png_file is None and sys.stdin.isatty()
+    if interactive:
+        import termios
+        import tty
+
+        saved = termios.tcgetattr(sys.stdin)
+        tty.setcbreak(sys.stdin)
+    released = 0.0
+    try:
+        if png_file is None:
+            sys.stdout.write("\x1b[2J")
+        while True:
+            if png_file is None:
+                sys.stdout.write("\x1b[H" + text(device.frame()) + "\n")
+                sys.stdout.flush()
+            else:
+                save(device.frame(), png_file)
+
+            deadline = time.monotonic() + 1 / fps
+            while (timeout := deadline - time.monotonic()) > 0:
+                if not interactive:
+                    time.sleep(timeout)
+                    break
+                ready, _, _ = select.select([sys.stdin], [], [], timeout)
+                if ready:
+                    typed = os.read(sys.stdin.fileno(), 16).decode(errors="ignore")
+                    device.key = ESCAPES.get(typed, ord(typed[0]) & 0xFFFF)
+                    released = time.monotonic() + hold
+            if interactive and released and time.monotonic() > released:
+                device.key = 0
+                released = 0.0
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if interactive:
+            termios.tcsetattr(sys.stdin, termios.TCSADRAIN, saved)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from hack_machine import load
+    from keyboard import Keyboard, read
+
+    parser = argparse.ArgumentParser(description="share the screen and keyboard")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run a program on a shared RAM")
+    run_parser.add_argument("program", type=Path, help=".hack or .asm")
+    run_parser.add_argument("device", type=Path, nargs="?", default=DEFAULT)
+    run_parser.add_argument("--cycles", type=int, default=0, help="0: till it halts")
+    run_parser.add_argument("--keys", type=Path, help="key script, see keyboard.py")
+
+    view_parser = commands.add_parser("view", help="watch a running program")
+    view_parser.add_argument("device", type=Path, nargs="?", default=DEFAULT)
+    view_parser.add_argument("--fps", type=float, default=10)
+    view_parser.add_argument("--hold", type=float, default=0.15, help="seconds")
+    view_parser.add_argument("--png", type=Path, help="draw into this file instead")
+
+    args = parser.parse_args()
+    match args.command:
+        case "run":
+            machine = load(args.program)
+            device = Device(args.device, create=True)
+            device.attach(machine)
+            run = machine.run
+            if args.keys:
+                keyboard = Keyboard(read(args.keys))
+                run = lambda cycles: keyboard.run(machine, cycles)
+
+            print(f"RAM shared in {args.device}")
+            start = time.perf_counter()
+            try:
+                while not machine.halted:
+                    chunk = 1_000_000
+                    if args.cycles:
+                        chunk = min(chunk, args.cycles - machine.cycles)
+                        if chunk <= 0:
+                            break
+                    run(chunk)
+            except KeyboardInterrupt:
+                pass
+            seconds = time.perf_counter() - start
+            print(
+                f"cycles: {machine.cycles} halted: {machine.halted}"
+                f" in {seconds:.3f}s, {machine.cycles / seconds:,.0f}/s"
+            )
+        case "view":
+            with Device(args.device) as device:
+                view(device, args.fps, args.hold, args.png)
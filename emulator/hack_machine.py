@@ -0,0 +1,188 @@
+"""
+reference
+
+see 4.2 Hack Machine Language Specification
+see 5.2.3 Central Processing Unit
+
+A plain software model of the Hack computer: 32K words of ROM,
+32K words of RAM (the screen and keyboard are memory mapped into it),
+and the three registers A, D and PC.
+
+Every word is stored as an unsigned 16-bit number (0..65535),
+`signed()` converts it back when it's needed.
+"""
+
+import sys
+from os import PathLike
+from pathlib import Path
+from typing import Iterable
+
+SCREEN = 16384
+KBD = 24576
+
+WORD = 0xFFFF
+
+# comp bits (a c1 c2 c3 c4 c5 c6) to ALU function
+# `y` is A or M, depends on the a-bit
+comp_table = {
+    0b0101010: lambda d, y: 0,
+    0b0111111: lambda d, y: 1,
+    0b0111010: lambda d, y: WORD,
+    0b0001100: lambda d, y: d,
+    0b0110000: lambda d, y: y,
+    0b0001101: lambda d, y: d ^ WORD,
+    0b0110001: lambda d, y: y ^ WORD,
+    0b0001111: lambda d, y: -d & WORD,
+    0b0110011: lambda d, y: -y & WORD,
+    0b0011111: lambda d, y: (d + 1) & WORD,
+    0b0110111: lambda d, y: (y + 1) & WORD,
+    0b0001110: lambda d, y: (d - 1) & WORD,
+    0b0110010: lambda d, y: (y - 1) & WORD,
+    0b0000010: lambda d, y: (d + y) & WORD,
+    0b0010011: lambda d, y: (d - y) & WORD,
+    0b0000111: lambda d, y: (y - d) & WORD,
+    0b0000000: lambda d, y: d & y,
+    0b0010101: lambda d, y: d | y,
+}
+
+
+def signed(word: int) -> int:
+    """
+    65535 -> -1
+    """
+    return word - 0x10000 if word & 0x8000 else word
+
+
+class Decoded:
+    """
+    an instruction decoded once, before running,
+    so the execution loop only does table lookups
+    """
+
+    __slots__ = ("is_a", "value", "alu", "use_m", "dest", "jump", "halt")
+
+    def __init__(self, word: int, address: int, previous: int = None):
+        self.is_a = not word & 0x8000
+        self.value = word
+        self.halt = False
+
+        if self.is_a:
+            return
+
+        comp = (word >> 6) & 0b1111111
+        self.alu = comp_table[comp & 0b0111111]
+        self.use_m = bool(comp & 0b1000000)
+        # d1 d2 d3 -> A D M
+        self.dest = (word >> 3) & 0b111
+        self.jump = word & 0b111
+
+        # (END)
+        # @END
+        # 0;JMP
+        # this is how a Hack program stops
+        self.halt = self.jump == 0b111 and previous == address - 1
+
+
+class Machine:
+    def __init__(self, rom: Iterable[int]):
+        self.rom = list(rom)
+        self.program = []
+        for address, word in enumerate(self.rom):
+            previous = self.rom[address - 1] if address > 0 else None
+            self.program.append(Decoded(word, address, previous))
+
+        self.reset()
+
+    @classmethod
+    def load(cls, hack_file: PathLike):
+        """
+        load a `.hack` file, one 16 chars binary string per line
+        """
+        with open(hack_file, "rt") as code:
+            return cls(int(line, 2) for line in map(str.strip, code) if line)
+
+    def reset(self):
+        self.ram = [0] * 32768
+        self.a = 0
+        self.d = 0
+        self.pc = 0
+        self.cycles = 0
+        self.halted = False
+
+    def run(self, cycles: int) -> int:
+        """
+        execute at most `cycles` instructions,
+        stop earlier if the program halts
+
+        return the number of instructions executed
+        """
+        program = self.program
+        ram = self.ram
+        size = len(program)
+        a, d, pc = self.a, self.d, self.pc
+
+        executed = 0
+        while executed < cycles:
+            if pc >= size:
+                self.halted = True
+                break
+
+            ins = program[pc]
+            if ins.is_a:
+                a = ins.value
+                pc += 1
+                executed += 1
+                continue
+
+            if ins.halt and a == pc - 1:
+                self.halted = True
+                break
+
+            if ins.use_m:
+                out = ins.alu(d, ram[a & 0x7FFF])
+            else:
+                out = ins.alu(d, a)
+
+            # the jump target is the A before this instruction
+            target = a & 0x7FFF
+            dest = ins.dest
+            if dest & 0b001:
+                ram[a & 0x7FFF] = out
+            if dest & 0b010:
+                d = out
+            if dest & 0b100:
+                a = out
+
+            jump = ins.jump
+            if jump and jump & (4 if out & 0x8000 else 2 if out == 0 else 1):
+                pc = target
+            else:
+                pc += 1
+            executed += 1
+
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += executed
+        return executed
+
+
+def load(program_file: PathLike) -> Machine:
+    """
+    a machine with a .hack or .asm program
+    """
+    program_file = Path(program_file)
+    if program_file.suffix != ".asm":
+        return Machine.load(program_file)
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "06 Assembler"))
+    from assembler import Parser
+
+    return Machine(int(bits, 2) for bits in Parser(program_file).machine_code())
+
+
+if __name__ == "__main__":
+    machine = load(sys.argv[1])
+    cycles = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000
+    machine.run(cycles)
+    print(f"cycles: {machine.cycles} halted: {machine.halted}")
+    print(f"A={signed(machine.a)} D={signed(machine.d)} PC={machine.pc}")
+    print("RAM[0..15]:", [signed(word) for word in machine.ram[:16]])
@@ -0,0 +1,148 @@
+"""
+reference
+
+see 4.2.5 Input/Output Handling
+see Figure 5.5 The Hack character set, special keys
+
+scripted input for programs which poll KBD, so Pong or Fill run headless,
+the same way every time, at full speed.
+
+a key script has one event per line, `//` starts a comment
+
+    // cycle   key        held for (optional)
+    2000000    right      500000
+    3000000    LEFT
+    3400000    -          // release
+    4000000    q          // a character, its code is ord("q")
+    4100000    131        // a code, up arrow
+
+the key is a name of KEYS, a single character or a code. from its cycle
+on, KBD holds the key until the next event, or for the given cycles.
+the machine runs uninterrupted between events.
+
+    python emulator/keyboard.py "06 Assembler/pong/Pong.asm" pong.keys --cycles 20000000
+"""
+
+from os import PathLike
+from typing import Iterable
+
+from hack_machine import KBD, Machine
+
+KEYS = {
+    "-": 0,
+    "space": 32,
+    "newline": 128,
+    "enter": 128,
+    "backspace": 129,
+    "left": 130,
+    "up": 131,
+    "right": 132,
+    "down": 133,
+    "home": 134,
+    "end": 135,
+    "pageup": 136,
+    "pagedown": 137,
+    "insert": 138,
+    "delete": 139,
+    "esc": 140,
+    **{f"f{n}": 140 + n for n in range(1, 13)},
+}
+
+Event = tuple[int, int]
+
+
+def key_code(key: str) -> int:
+    if key.lower() in KEYS:
+        return KEYS[key.lower()]
+    if len(key) == 1:
+        return ord(key)
+    if key.isdigit() and int(key) < 0x10000:
+        return int(key)
+    raise ValueError(f"unknown key {key}")
+
+
+def parse(script: Iterable[str]) -> list[Event]:
+    """
+    (cycle, key code) of every change of KBD, in order
+    """
+    events = []
+    for number, line in enumerate(script, 1):
+        fields = line.split("//")[0].split()
+        if not fields:
+            continue
+        try:
+            match fields:
+                case [cycle, key]:
+                    events.append((int(cycle), key_code(key)))
+                case [cycle, key, held]:
+                    events.append((int(cycle), key_code(key)))
+                    events.append((int(cycle) + int(held), 0))
+                case _:
+                    raise ValueError("expected: cycle key [held]")
+        except ValueError as error:
+            raise ValueError(f"line {number}: {error}") from None
+    # sorted is stable, a release scheduled by `held` goes before a later press
+    return sorted(events, key=lambda event: event[0])
+
+
+def read(script_file: PathLike) -> list[Event]:
+    with open(script_file, "rt") as script:
+        return parse(script)
+
+
+class Keyboard:
+    """
+    replays events on a machine, use `run` instead of `Machine.run`
+    """
+
+    def __init__(self, events: list[Event]):
+        self.events = events
+        self.next = 0
+
+    def run(self, machine: Machine, cycles: int) -> int:
+        """
+        like `Machine.run`, with KBD set at the cycles of the events
+        """
+        events = self.events
+        end = machine.cycles + cycles
+        executed = 0
+        while machine.cycles < end and not machine.halted:
+            while self.next < len(events) and events[self.next][0] <= machine.cycles:
+                machine.ram[KBD] = events[self.next][1]
+                self.next += 1
+            stop = end
+            if self.next < len(events):
+                stop = min(stop, events[self.next][0])
+            executed += machine.run(stop - machine.cycles)
+        return executed
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from pathlib import Path
+
+    from hack_machine import load, signed
+    from screen import frame, save
+
+    parser = argparse.ArgumentParser(description="run a program with a key script")
+    parser.add_argument("program", type=Path, help=".hack or .asm")
+    parser.add_argument("keys", type=Path, help="key script")
+    parser.add_argument("--cycles", type=int, default=10_000_000)
+    parser.add_argument("--screen", type=Path, help="save the screen, .png or .pbm")
+    args = parser.parse_args()
+
+    machine = load(args.program)
+    keyboard = Keyboard(read(args.keys))
+    start = time.perf_counter()
+    keyboard.run(machine, args.cycles)
+    seconds = time.perf_counter() - start
+
+    print(
+        f"cycles: {machine.cycles} halted: {machine.halted}"
+        f" in {seconds:.3f}s, {machine.cycles / seconds:,.0f}/s"
+    )
+    print(f"A={signed(machine.a)} D={signed(machine.d)} PC={machine.pc}")
+    print("RAM[0..15]:", [signed(word) for word in machine.ram[:16]])
+    if args.screen:
+        save(frame(machine.ram), args.screen)
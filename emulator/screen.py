@@ -0,0 +1,427 @@
+"""
+reference
+
+see 4.2.5 Input/Output Handling
+see 5.2.4 Memory, Screen
+
+the screen of the Hack computer without a GUI: the 8K words at SCREEN
+as PBM or PNG images, and runs recorded as a stream of frames. a screen is
+compared with a GIF screenshot, like those of the course tests, at its scale.
+
+pixel (row, col) is bit col % 16 of RAM[SCREEN + row * 32 + col // 16],
+the least significant bit is the leftmost pixel, 1 is black.
+a PBM row is the same bits, the most significant one leftmost. so a frame
+is the screen words as little-endian bytes, every byte bit-reversed:
+`numpy.unpackbits` and `packbits` with opposite bit orders where NumPy is
+installed, one `bytes.translate` over the whole screen where it isn't.
+
+    # the screen after 100K cycles
+    python emulator/screen.py capture rect/Rect.asm --ram 0=50 -o rect.png
+
+    # every 100K cycles of a long run, then check it against a golden run
+    python emulator/screen.py record Pong.hack --cycles 20000000 --every 100000 -o pong.frames
+    python emulator/screen.py diff pong.frames golden.frames
+"""
+
+import gzip
+import struct
+import sys
+import zlib
+from array import array
+from functools import partial
+from os import PathLike
+from pathlib import Path
+from typing import Iterator
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from hack_machine import KBD, SCREEN, Machine, load
+from keyboard import Keyboard, read
+
+WIDTH = 512
+HEIGHT = 256
+ROW_BYTES = WIDTH // 8
+FRAME_BYTES = ROW_BYTES * HEIGHT
+
+# byte -> its bits in reverse order
+REVERSE = bytes(int(f"{byte:08b}"[::-1], 2) for byte in range(256))
+# PNG grayscale has 0 black, the opposite of PBM
+INVERT = bytes(byte ^ 0xFF for byte in range(256))
+
+
+def frame(ram: list[int]) -> bytes:
+    """
+    the screen as 256 rows of 64 bytes, the bits of a PBM
+    """
+    if np is not None:
+        words = np.asarray(ram[SCREEN:KBD], dtype="<u2")
+        bits = np.unpackbits(words.view(np.uint8), bitorder="little")
+        return np.packbits(bits).tobytes()
+    words = array("H", ram[SCREEN:KBD])
+    if sys.byteorder == "big":
+        words.byteswap()
+    return words.tobytes().translate(REVERSE)
+
+
+def pbm(frame: bytes) -> bytes:
+    return b"P4\n%d %d\n" % (WIDTH, HEIGHT) + frame
+
+
+def png(frame: bytes) -> bytes:
+    """
+    1 bit grayscale PNG, every row without filter
+    """
+    pixels = frame.translate(INVERT)
+    rows = b"".join(
+        b"\x00" + pixels[start : start + ROW_BYTES]
+        for start in range(0, FRAME_BYTES, ROW_BYTES)
+    )
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        crc = zlib.crc32(kind + data)
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", crc)
+
+    header = struct.pack(">IIBBBBB", WIDTH, HEIGHT, 1, 0, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(rows, 9))
+        + chunk(b"IEND", b"")
+    )
+
+
+def save(frame: bytes, image_file: PathLike):
+    """
+    .png or .pbm, by the suffix
+    """
+    image_file = Path(image_file)
+    encode = png if image_file.suffix == ".png" else pbm
+    image_file.write_bytes(encode(frame))
+
+
+def pixels(frame: bytes) -> int:
+    """
+    number of black pixels
+    """
+    return int.from_bytes(frame, "big").bit_count()
+
+
+def difference(a: bytes, b: bytes) -> int:
+    """
+    number of pixels which differ
+    """
+    return (int.from_bytes(a, "big") ^ int.from_bytes(b, "big")).bit_count()
+
+
+def read_gif(image_file: PathLike) -> tuple[int, int, list[list[float]]]:
+    """
+    width, height and the darkness of every pixel, 0 white to 1 black,
+    of the first image of a GIF, like the screenshots the course tests show
+    """
+    data = Path(image_file).read_bytes()
+    if data[:6] not in [b"GIF87a", b"GIF89a"]:
+        raise ValueError(f"{image_file} is not a GIF")
+    width, height, flags = struct.unpack_from("<HHB", data, 6)
+    position = 13
+    colors = []
+    if flags & 0x80:
+        count = 2 << (flags & 7)
+        colors = [data[position + 3 * i : position + 3 * i + 3] for i in range(count)]
+        position += 3 * count
+
+    def blocks() -> bytes:
+        nonlocal position
+        chunks = []
+        while size := data[position]:
+            chunks.append(data[position + 1 : position + 1 + size])
+            position += size + 1
+        position += 1
+        return b"".join(chunks)
+
+    while data[position] == 0x21:
+        # extension: label, then its blocks
+        position += 2
+        blocks()
+    if data[position] != 0x2C:
+        raise ValueError(f"{image_file} has no image")
+    _, _, image_width, image_height, flags = struct.unpack_from(
+        "<HHHHB", data, position + 1
+    )
+    position += 10
+    if flags & 0x80:
+        count = 2 << (flags & 7)
+        colors = [data[position + 3 * i : position + 3 * i + 3] for i in range(count)]
+        position += 3 * count
+    if flags & 0x40 or (image_width, image_height) != (width, height):
+        raise ValueError(f"{image_file}: only whole, not interlaced images")
+    code_size = data[position]
+    position += 1
+    indexes = lzw(blocks(), code_size)
+
+    darkness = [1 - sum(color) / 765 for color in colors]
+    return (
+        width,
+        height,
+        [
+            [darkness[index] for index in indexes[row * width : (row + 1) * width]]
+            for row in range(height)
+        ],
+    )
+
+
+def lzw(data: bytes, code_size: int) -> bytes:
+    """
+    the variable width LZW of GIF, codes packed from the least significant bit
+    """
+    clear = 1 << code_size
+    end = clear + 1
+    bits = int.from_bytes(data, "little")
+    total = len(data) * 8
+    output = bytearray()
+    table, width, previous = [], code_size + 1, None
+    position = 0
+    while position + width <= total:
+        code = bits >> position & ((1 << width) - 1)
+        position += width
+        if code == clear:
+            table = [bytes([i]) for i in range(clear)] + [b"", b""]
+            width, previous = code_size + 1, None
+            continue
+        if code == end:
+            break
+        entry = table[code] if code < len(table) else previous + previous[:1]
+        output += entry
+        if previous is not None:
+            table.append(previous + entry[:1])
+            if len(table) == 1 << width and width < 12:
+                width += 1
+        previous = entry
+    return bytes(output)
+
+
+def picture_difference(
+    frame: bytes,
+    picture: tuple[int, int, list[list[float]]],
+    box: tuple[float, float, float, float],
+) -> int:
+    """
+    number of pixels of a picture, a scaled screenshot, which the screen
+    doesn't explain. `box` is (left, top, width, height) of the screen in the
+    picture. the screen is shrunk into it, every picture pixel the share of
+    black of what it covers, and a pixel differs by more than half from all
+    of its neighbours there: a line of the screenshot can be one pixel off
+    """
+    width, height, darkness = picture
+    left, top, box_width, box_height = box
+
+    def shares(size: int, start: float, length: float, pixels: int):
+        # picture pixel -> (screen pixel, the part of the picture pixel it covers)
+        scale = length / pixels
+        covers = [[] for _ in range(size)]
+        for pixel in range(pixels):
+            begin = start + pixel * scale
+            end = begin + scale
+            for index in range(max(0, int(begin)), min(size, int(end) + 1)):
+                part = min(end, index + 1) - max(begin, index)
+                if part > 0:
+                    covers[index].append((pixel, part))
+        return covers
+
+    columns = shares(width, left, box_width, WIDTH)
+    rows = shares(height, top, box_height, HEIGHT)
+    screen_rows = [
+        int.from_bytes(frame[row * ROW_BYTES : (row + 1) * ROW_BYTES], "big")
+        for row in range(HEIGHT)
+    ]
+    narrow = [
+        [
+            sum(part for pixel, part in cover if bits >> (WIDTH - 1 - pixel) & 1)
+            for cover in columns
+        ]
+        if bits
+        else [0] * width
+        for bits in screen_rows
+    ]
+    shrunk = [
+        [
+            sum(part * narrow[pixel][column] for pixel, part in cover)
+            for column in range(width)
+        ]
+        for cover in rows
+    ]
+
+    # the edges of the box blend with the window around the screen
+    differ = 0
+    for row in range(max(1, int(top) + 1), min(height - 1, int(top + box_height))):
+        for column in range(
+            max(1, int(left) + 1), min(width - 1, int(left + box_width))
+        ):
+            dark = darkness[row][column]
+            if all(
+                abs(dark - shrunk[near_row][near_column]) > 0.5
+                for near_row in range(row - 1, row + 2)
+                for near_column in range(column - 1, column + 2)
+            ):
+                differ += 1
+    return differ
+
+
+# a frame stream is gzip of
+#   MAGIC
+#   for every frame: cycles (uint64 little-endian), frame xor the previous one
+# consecutive frames are mostly the same, their xor is mostly zeros
+MAGIC = b"HACK-FRAMES 1\n"
+CYCLES = struct.Struct("<Q")
+
+
+class FrameWriter:
+    def __init__(self, stream_file: PathLike):
+        self.file = gzip.open(stream_file, "wb")
+        self.file.write(MAGIC)
+        self.previous = bytes(FRAME_BYTES)
+
+    def write(self, cycles: int, frame: bytes):
+        delta = int.from_bytes(frame, "big") ^ int.from_bytes(self.previous, "big")
+        self.file.write(CYCLES.pack(cycles) + delta.to_bytes(FRAME_BYTES, "big"))
+        self.previous = frame
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_frames(stream_file: PathLike) -> Iterator[tuple[int, bytes]]:
+    """
+    yield (cycles, frame) of a frame stream
+    """
+    with gzip.open(stream_file, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{stream_file} is not a frame stream")
+        previous = 0
+        size = CYCLES.size + FRAME_BYTES
+        while record := file.read(size):
+            if len(record) != size:
+                raise ValueError(f"{stream_file} is truncated")
+            (cycles,) = CYCLES.unpack_from(record)
+            previous ^= int.from_bytes(record[CYCLES.size :], "big")
+            yield cycles, previous.to_bytes(FRAME_BYTES, "big")
+
+
+def record(
+    machine: Machine,
+    cycles: int,
+    every: int,
+    stream_file: PathLike,
+    keyboard: Keyboard = None,
+) -> int:
+    """
+    run `machine` for at most `cycles`, keep the screen every `every` cycles
+    and when it halts. return the number of frames
+    """
+    if every < 1:
+        raise ValueError("record at least every cycle")
+    run = machine.run if keyboard is None else partial(keyboard.run, machine)
+    count = 0
+    with FrameWriter(stream_file) as writer:
+        end = machine.cycles + cycles
+        while machine.cycles < end and not machine.halted:
+            run(min(every, end - machine.cycles))
+            writer.write(machine.cycles, frame(machine.ram))
+            count += 1
+    return count
+
+
+def diff(stream_file: PathLike, golden_file: PathLike) -> list[tuple[int, int, int]]:
+    """
+    (index, cycles, different pixels) of every frame which differs from the golden
+    one, or whose cycles differ. a missing frame differs in all its pixels
+    """
+    frames = list(read_frames(stream_file))
+    golden = list(read_frames(golden_file))
+    differences = []
+    for index in range(max(len(frames), len(golden))):
+        if index >= len(frames) or index >= len(golden):
+            cycles, _ = (frames if index < len(frames) else golden)[index]
+            differences.append((index, cycles, WIDTH * HEIGHT))
+            continue
+        (cycles, screen), (golden_cycles, golden_screen) = frames[index], golden[index]
+        count = difference(screen, golden_screen)
+        if count or cycles != golden_cycles:
+            differences.append((index, cycles, count))
+    return differences
+
+
+if __name__ == "__main__":
+    import argparse
+
+    def assignment(text: str) -> tuple[int, int]:
+        address, value = text.split("=")
+        return int(address), int(value) & 0xFFFF
+
+    parser = argparse.ArgumentParser(description="headless screen of the hack computer")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    capture_parser = commands.add_parser("capture", help="save the screen after a run")
+    record_parser = commands.add_parser("record", help="record a run as frames")
+    for command in [capture_parser, record_parser]:
+        command.add_argument("program", type=Path, help=".hack or .asm")
+        command.add_argument("--cycles", type=int, default=1_000_000)
+        command.add_argument(
+            "--ram",
+            type=assignment,
+            action="append",
+            default=[],
+            metavar="ADDRESS=VALUE",
+            help="set RAM before running, e.g. --ram 0=50",
+        )
+        command.add_argument("--keys", type=Path, help="key script, see keyboard.py")
+    capture_parser.add_argument("-o", "--output", type=Path, help=".png or .pbm")
+    record_parser.add_argument("--every", type=int, default=100_000)
+    record_parser.add_argument("-o", "--output", type=Path, required=True)
+
+    diff_parser = commands.add_parser("diff", help="compare with golden frames")
+    diff_parser.add_argument("frames", type=Path)
+    diff_parser.add_argument("golden", type=Path)
+
+    export_parser = commands.add_parser("export", help="frames to images")
+    export_parser.add_argument("frames", type=Path)
+    export_parser.add_argument("folder", type=Path)
+    export_parser.add_argument("--format", choices=["png", "pbm"], default="png")
+
+    args = parser.parse_args()
+    match args.command:
+        case "capture" | "record":
+            machine = load(args.program)
+            for address, value in args.ram:
+                machine.ram[address] = value
+            keyboard = Keyboard(read(args.keys)) if args.keys else None
+            if args.command == "capture":
+                output = args.output or Path(args.program.stem + ".png")
+                if keyboard is None:
+                    machine.run(args.cycles)
+                else:
+                    keyboard.run(machine, args.cycles)
+                save(frame(machine.ram), output)
+                print(f"{output}: cycles {machine.cycles} halted {machine.halted}")
+            else:
+                count = record(
+                    machine, args.cycles, args.every, args.output, keyboard
+                )
+                print(f"{args.output}: {count} frames, cycles {machine.cycles}")
+        case "diff":
+            differences = diff(args.frames, args.golden)
+            for index, cycles, count in differences:
+                print(f"frame {index} at cycle {cycles}: {count} pixels differ")
+            sys.exit(1 if differences else 0)
+        case "export":
+            args.folder.mkdir(parents=True, exist_ok=True)
+            for index, (cycles, screen) in enumerate(read_frames(args.frames)):
+                save(screen, args.folder / f"{index:05d}-{cycles}.{args.format}")
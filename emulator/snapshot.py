@@ -0,0 +1,217 @@
+"""
+snapshots of a running Hack computer, to start tests and fuzzers from a warm
+checkpoint (e.g. just after the bootstrap reached Sys.init) instead of
+running the startup path again every time.
+
+a snapshot is one buffer of little-endian uint16 words
+
+    0..3    "HACKSNAP"
+    4       version
+    5..7    A, D, PC
+    8       halted
+    9..12   cycles, 64 bits, least significant word first
+    13..14  crc32 of the ROM, a snapshot only restores into the same program
+    15      reserved
+    16..    RAM, 32K words
+
+restoring maps the file and views it as words, there is no parsing. the RAM
+is copied once, where it goes: a Machine turns the view into its list in one
+call, a Batch copies it into every machine with NumPy. on a big-endian host
+a view can't swap bytes, the file is read into a swapped copy instead.
+
+    # run the bootstrap of StaticsTest once
+    python emulator/snapshot.py save StaticsTest.asm statics.snap --until Sys.init
+    # then start from there
+    python emulator/snapshot.py run StaticsTest.asm statics.snap --cycles 10000
+"""
+
+import mmap
+import sys
+import zlib
+from array import array
+from os import PathLike
+from pathlib import Path
+
+from hack_machine import Machine
+
+MAGIC = array("H", b"HACKSNAP")
+VERSION = 1
+HEADER = 16
+RAM = 32768
+
+
+def rom_crc(machine: Machine) -> int:
+    words = array("H", machine.rom)
+    if sys.byteorder == "big":
+        words.byteswap()
+    return zlib.crc32(words.tobytes())
+
+
+def save(machine: Machine, snapshot_file: PathLike):
+    crc = rom_crc(machine)
+    cycles = [(machine.cycles >> shift) & 0xFFFF for shift in (0, 16, 32, 48)]
+    header = [machine.a, machine.d, machine.pc, int(machine.halted), *cycles]
+    words = array("H", MAGIC.tolist() + [VERSION] + header)
+    words.extend([crc & 0xFFFF, crc >> 16, 0])
+    words.extend(machine.ram)
+    if sys.byteorder == "big":
+        words.byteswap()
+    with open(snapshot_file, "wb") as out:
+        words.tofile(out)
+
+
+class Snapshot:
+    """
+    a snapshot file mapped into memory
+
+        with Snapshot("statics.snap") as snapshot:
+            snapshot.restore(machine)
+    """
+
+    def __init__(self, snapshot_file: PathLike):
+        self.snapshot_file = snapshot_file
+        with open(snapshot_file, "rb") as file:
+            # words can't be cast from a truncated file, nor mapped from an empty one
+            if Path(snapshot_file).stat().st_size != 2 * (HEADER + RAM):
+                raise ValueError(f"{snapshot_file} is not a snapshot")
+            self.mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.words = memoryview(self.mapped).cast("H")
+        if sys.byteorder == "big":
+            # the words are little-endian, a view can't swap them
+            words = array("H", self.words)
+            words.byteswap()
+            self.words.release()
+            self.words = memoryview(words)
+
+        words = self.words
+        if words[:4].tolist() != MAGIC.tolist():
+            self.close()
+            raise ValueError(f"{snapshot_file} is not a snapshot")
+        if words[4] != VERSION:
+            self.close()
+            raise ValueError(f"{snapshot_file} is version {words[4]}")
+
+        self.a, self.d, self.pc = words[5:8].tolist()
+        self.halted = bool(words[8])
+        self.cycles = words[9] | words[10] << 16 | words[11] << 32 | words[12] << 48
+        self.crc = words[13] | words[14] << 16
+        self.ram = words[HEADER:]
+
+    def check(self, rom_crc: int):
+        if rom_crc != self.crc:
+            raise ValueError(f"{self.snapshot_file} is a snapshot of another program")
+
+    def restore(self, machine: Machine):
+        self.check(rom_crc(machine))
+        machine.ram = self.ram.tolist()
+        machine.a, machine.d, machine.pc = self.a, self.d, self.pc
+        machine.cycles = self.cycles
+        machine.halted = self.halted
+
+    def restore_batch(self, batch):
+        """
+        every machine of a `batch.Batch` starts from this snapshot
+        """
+        import numpy as np
+
+        self.check(zlib.crc32(batch.rom[: batch.size].astype("<u2").tobytes()))
+        # the words are in native order already, swapped on a big-endian host
+        batch.ram[:] = np.frombuffer(self.ram, dtype=np.uint16)
+        batch.a[:] = self.a
+        batch.d[:] = self.d
+        batch.pc[:] = self.pc
+        batch.cycles[:] = self.cycles
+        batch.halted[:] = self.halted
+
+    def close(self):
+        # views must go before the map
+        self.ram = None
+        self.words.release()
+        self.mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_until(machine: Machine, address: int, cycles: int) -> bool:
+    """
+    run till PC is `address`, at most `cycles` instructions,
+    return whether it got there
+    """
+    end = machine.cycles + cycles
+    while machine.pc != address:
+        if machine.halted or machine.cycles >= end:
+            return False
+        machine.run(1)
+    return True
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from hack_machine import load, signed
+
+    def assignment(text: str) -> tuple[int, int]:
+        address, value = text.split("=")
+        return int(address), int(value) & 0xFFFF
+
+    parser = argparse.ArgumentParser(description="snapshots of the hack computer")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    save_parser = commands.add_parser("save", help="run a program and snapshot it")
+    save_parser.add_argument("program", type=Path, help=".hack or .asm")
+    save_parser.add_argument("snapshot", type=Path)
+    save_parser.add_argument("--cycles", type=int, default=1_000_000)
+    save_parser.add_argument(
+        "--until",
+        help="stop at this ROM address, or label of an .asm program, e.g. Sys.init",
+    )
+    save_parser.add_argument(
+        "--ram",
+        type=assignment,
+        action="append",
+        default=[],
+        metavar="ADDRESS=VALUE",
+        help="set RAM before running, e.g. --ram 0=256",
+    )
+
+    run_parser = commands.add_parser("run", help="continue a program from a snapshot")
+    run_parser.add_argument("program", type=Path, help=".hack or .asm")
+    run_parser.add_argument("snapshot", type=Path)
+    run_parser.add_argument("--cycles", type=int, default=1_000_000)
+
+    args = parser.parse_args()
+    machine = load(args.program)
+    match args.command:
+        case "save":
+            for address, value in args.ram:
+                machine.ram[address] = value
+            if args.until is None:
+                machine.run(args.cycles)
+            else:
+                if args.until.isdigit():
+                    address = int(args.until)
+                elif args.program.suffix != ".asm":
+                    sys.exit(f"{args.program} has no labels, --until needs the .asm")
+                else:
+                    # filled in by the assembler when `load` assembled the program
+                    from assembler import symbol_table
+
+                    if args.until not in symbol_table:
+                        sys.exit(f"no label {args.until} in {args.program}")
+                    address = symbol_table[args.until]
+                if not run_until(machine, address, args.cycles):
+                    sys.exit(f"PC didn't reach {args.until} in {args.cycles} cycles")
+            save(machine, args.snapshot)
+            print(f"{args.snapshot}: cycles {machine.cycles} PC={machine.pc}")
+        case "run":
+            with Snapshot(args.snapshot) as snapshot:
+                snapshot.restore(machine)
+            machine.run(args.cycles)
+
+    print(f"cycles: {machine.cycles} halted: {machine.halted}")
+    print(f"A={signed(machine.a)} D={signed(machine.d)} PC={machine.pc}")
+    print("RAM[0..15]:", [signed(word) for word in machine.ram[:16]])
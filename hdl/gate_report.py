@@ -0,0 +1,127 @@
+"""
+how much hardware a chip costs, and how fast it could be clocked
+
+1. the number of Nand gates and DFFs, in total and per part
+2. the critical path: the longest chain of Nand gates between
+   inputs / DFFs / builtin parts and outputs / DFFs / builtin parts
+3. fan-out hot spots: nets feeding the most gate inputs
+
+    python hdl/gate_report.py "02 Boolean Arithmetic/Add16.hdl" MyAdd16.hdl
+"""
+
+from collections import Counter
+from os import PathLike
+from pathlib import Path
+
+from hdl_simulator import Compiler, Netlist, load
+
+
+class Report:
+    def __init__(self, netlist: Netlist):
+        self.netlist = netlist
+        self.name = netlist.chip.name
+        self.nands = len(netlist.nands)
+        self.dffs = len(netlist.dffs)
+        self.builtins = len(netlist.builtins)
+
+        # nands and dffs of every part of the chip, e.g. `ALU#5`
+        self.parts = Counter()
+        for out, _, _ in netlist.nands:
+            self.parts[self.part(out)] += 1
+        for out, _ in netlist.dffs:
+            self.parts[self.part(out)] += 1
+
+        self.fanout = Counter()
+        for _, a, b in netlist.nands:
+            self.fanout[a] += 1
+            self.fanout[b] += 1
+        for _, net in netlist.dffs:
+            self.fanout[net] += 1
+        for _, ins, _, _ in netlist.builtins:
+            for nets in ins.values():
+                self.fanout.update(nets)
+        for net in [Netlist.FALSE, Netlist.TRUE]:
+            self.fanout.pop(net, None)
+
+        self.depth, self.path = self.critical_path()
+
+    def part(self, net: int) -> str:
+        """
+        the part of the chip a net is inside of, `-` for the chip itself
+        """
+        names = self.netlist.names[net].split(".")
+        return names[1] if len(names) > 2 and "#" in names[1] else "-"
+
+    def critical_path(self) -> tuple[int, list[int]]:
+        """
+        (number of Nand gates, nets from the start to the end) of the longest path
+        """
+        compiler = Compiler(self.netlist, "words")
+        compiler.sort()
+        gates = compiler.gates
+
+        depth = {}
+        for out in compiler.order:
+            _, a, b = gates[out]
+            depth[out] = 1 + max(depth.get(a, 0), depth.get(b, 0))
+
+        ends = [net for nets in self.netlist.outputs.values() for net in nets]
+        ends += [net for _, net in self.netlist.dffs]
+        for _, ins, _, _ in self.netlist.builtins:
+            ends += [net for nets in ins.values() for net in nets]
+        if not ends:
+            return 0, []
+
+        net = max(ends, key=lambda net: depth.get(net, 0))
+        path = [net]
+        while net in gates:
+            _, a, b = gates[net]
+            net = a if depth.get(a, 0) >= depth.get(b, 0) else b
+            path.append(net)
+        path.reverse()
+        return depth.get(path[-1], 0), path
+
+    def format(self, hot_spots: int = 10) -> str:
+        names = self.netlist.names
+        lines = [
+            self.name,
+            f"  nand gates    {self.nands:>8}",
+            f"  dffs          {self.dffs:>8}",
+            f"  builtin parts {self.builtins:>8}",
+            f"  critical path {self.depth:>8} nands",
+        ]
+        for level, net in enumerate(self.path):
+            lines.append(f"    {level:>4}  {names[net]}")
+
+        lines.append("  fan-out")
+        for net, count in self.fanout.most_common(hot_spots):
+            lines.append(f"    {count:>4}  {names[net]}")
+
+        if len(self.parts) > 1:
+            lines.append("  parts (nands + dffs)")
+            for part, count in self.parts.most_common():
+                lines.append(f"    {count:>8}  {part}")
+        return "\n".join(lines)
+
+
+def report(hdl_file: PathLike) -> Report:
+    return Report(load(hdl_file))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="gate count and critical path")
+    parser.add_argument("hdl_files", type=Path, nargs="+")
+    parser.add_argument("--hot-spots", type=int, default=10)
+    args = parser.parse_args()
+
+    reports = [report(hdl_file) for hdl_file in args.hdl_files]
+    for each in reports:
+        print(each.format(args.hot_spots))
+        print()
+
+    if len(reports) > 1:
+        print(f"{'chip':<40} {'nands':>8} {'dffs':>8} {'depth':>6}")
+        for hdl_file, each in zip(args.hdl_files, reports):
+            print(f"{str(hdl_file):<40} {each.nands:>8} {each.dffs:>8} {each.depth:>6}")
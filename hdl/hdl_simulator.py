@@ -0,0 +1,1260 @@
+"""
+reference
+
+see Appendix A: Hardware Description Language (HDL)
+see Appendix B: Test Scripting Language
+
+A HardwareSimulator without java:
+
+1. parse `CHIP ... PARTS:` definitions
+2. resolve sub chips recursively, and flatten them into a netlist,
+   which only has Nand gates, DFFs and a few builtin parts
+   (ROM32K, Screen, Keyboard can't be built from Nand gates)
+3. sort the netlist topologically and generate ONE python function
+   which evaluates the whole chip
+4. run `.tst` scripts against it, and compare with the `.cmp` files
+
+every net is a single bit, a bus `x[16]` is 16 nets.
+
+RAM16K is millions of gates, `--fast` swaps our memory chips for array-backed
+models (MODELS), and `--cross-check` checks every model against its gates.
+
+    python hdl/hdl_simulator.py --fast --key K --key Y Memory.tst
+"""
+
+import re
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from os import PathLike
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# where to find the chips we built,
+# after the directory of the chip being loaded
+CHAPTERS = [
+    ROOT / "01 Boolean Logic",
+    ROOT / "02 Boolean Arithmetic",
+    ROOT / "03 Sequential Logic/a",
+    ROOT / "03 Sequential Logic/b",
+    ROOT / "05 Computer Architecture",
+]
+
+# builtin chips with the same interface as ours
+ALIASES = {"ARegister": "Register", "DRegister": "Register"}
+
+
+class HDLError(Exception):
+    pass
+
+
+class ChipDef:
+    """
+    CHIP name {
+        IN a, b[16];
+        OUT out[16];
+        PARTS:
+        Part(pin=net, pin[i..j]=net[k], ...);
+    }
+    """
+
+    def __init__(self, name: str, inputs: dict, outputs: dict, parts: list):
+        self.name = name
+        # pin name -> width
+        self.inputs = inputs
+        self.outputs = outputs
+        # (chip name, [(pin, pin range, net, net range), ...])
+        self.parts = parts
+
+    @classmethod
+    def parse(cls, text: str):
+        text = re.sub(r"/\*.*?\*/", " ", text, flags=re.DOTALL)
+        text = re.sub(r"//[^\n]*", " ", text)
+        tokens = re.findall(r"\.\.|[A-Za-z_][\w.]*|\d+|[{}()\[\];,=:]", text)
+        tokens.reverse()
+
+        def take(expected: str = None) -> str:
+            if not tokens:
+                raise HDLError(f"unexpected end, expect {expected}")
+            token = tokens.pop()
+            if expected is not None and token != expected:
+                raise HDLError(f"expect {expected}, got {token}")
+            return token
+
+        def peek() -> str:
+            return tokens[-1] if tokens else None
+
+        def sub():
+            """
+            [i] or [i..j] -> (i, j), no subscript -> None
+            """
+            if peek() != "[":
+                return None
+            take("[")
+            start = end = int(take())
+            if peek() == "..":
+                take("..")
+                end = int(take())
+            take("]")
+            return start, end
+
+        def pins():
+            declared = {}
+            while True:
+                name = take()
+                width = sub()
+                declared[name] = width[0] if width else 1
+                if take() == ";":
+                    return declared
+
+        take("CHIP")
+        name = take()
+        take("{")
+        inputs, outputs, parts = {}, {}, []
+        while peek() != "}":
+            match take():
+                case "IN":
+                    inputs = pins()
+                case "OUT":
+                    outputs = pins()
+                case "PARTS":
+                    take(":")
+                case "BUILTIN" | "CLOCKED":
+                    while take() != ";":
+                        pass
+                case part:
+                    take("(")
+                    connections = []
+                    while True:
+                        pin, pin_range = take(), sub()
+                        take("=")
+                        net, net_range = take(), sub()
+                        connections.append((pin, pin_range, net, net_range))
+                        if take() == ")":
+                            break
+                    take(";")
+                    parts.append((part, connections))
+        take("}")
+        return cls(name, inputs, outputs, parts)
+
+
+class Builtin(ABC):
+    """
+    a builtin part, evaluated by python instead of gates
+
+    the output only depends on the state and the inputs listed in `reads`,
+    the rest of inputs are only sampled by the clock
+    """
+
+    inputs = {}
+    outputs = {"out": 16}
+    reads = []
+
+    @abstractmethod
+    def read(self, *values) -> int:
+        """
+        the output, from the state and the inputs of `reads`
+        """
+
+    def tick(self, *values):
+        pass
+
+    def tock(self):
+        pass
+
+    def sampled(self) -> int:
+        """
+        `Part[]` in test scripts, the value right after `tick`
+        """
+        return self.read()
+
+
+class RAM(Builtin):
+    reads = ["address"]
+
+    def __init__(self, size: int):
+        self.inputs = {"in": 16, "load": 1, "address": size.bit_length() - 1}
+        self.words = [0] * size
+        self.pending = None
+
+    def read(self, address: int) -> int:
+        return self.words[address]
+
+    def tick(self, value: int, load: int, address: int):
+        self.pending = (address, value) if load else None
+
+    def tock(self):
+        if self.pending is not None:
+            address, value = self.pending
+            self.words[address] = value
+            self.pending = None
+
+    def __getitem__(self, index: int) -> int:
+        return self.words[index]
+
+    def __setitem__(self, index: int, value: int):
+        self.words[index] = value
+
+
+class Screen(RAM):
+    def __init__(self):
+        super().__init__(8192)
+
+
+class ROM32K(RAM):
+    def __init__(self):
+        super().__init__(32768)
+        self.inputs = {"address": 15}
+
+    def tick(self, address: int):
+        pass
+
+    def load(self, hack_file: PathLike):
+        with open(hack_file, "rt") as code:
+            words = [int(line, 2) for line in map(str.strip, code) if line]
+        self.words[: len(words)] = words
+
+
+class Keyboard(Builtin):
+    def __init__(self):
+        self.key = 0
+
+    def read(self) -> int:
+        return self.key
+
+
+class Register(Builtin):
+    def __init__(self, width: int = 16):
+        self.inputs = {"in": width, "load": 1}
+        self.outputs = {"out": width}
+        self.value = 0
+        self.pending = None
+
+    def read(self) -> int:
+        return self.value
+
+    def tick(self, value: int, load: int):
+        self.pending = value if load else None
+
+    def tock(self):
+        if self.pending is not None:
+            self.value = self.pending
+            self.pending = None
+
+    def sampled(self) -> int:
+        return self.value if self.pending is None else self.pending
+
+    def __getitem__(self, index: int) -> int:
+        """
+        `ARegister[0]`, a register is a memory of one word
+        """
+        return self.sampled()
+
+
+class PC(Register):
+    def __init__(self):
+        super().__init__()
+        self.inputs = {"in": 16, "load": 1, "inc": 1, "reset": 1}
+
+    def tick(self, value: int, load: int, inc: int, reset: int):
+        if reset:
+            self.pending = 0
+        elif load:
+            self.pending = value
+        elif inc:
+            self.pending = (self.value + 1) & 0xFFFF
+        else:
+            self.pending = None
+
+
+# parts which can't be built from Nand gates
+BUILTINS = {"ROM32K": ROM32K, "Screen": Screen, "Keyboard": Keyboard}
+
+# array-backed models of our own chips, used instead of their gates when asked
+MODELS = {
+    "Bit": lambda: Register(1),
+    "Register": Register,
+    "ARegister": Register,
+    "DRegister": Register,
+    "PC": PC,
+    "RAM8": lambda: RAM(8),
+    "RAM64": lambda: RAM(64),
+    "RAM512": lambda: RAM(512),
+    "RAM4K": lambda: RAM(4096),
+    "RAM16K": lambda: RAM(16384),
+}
+
+
+class Library:
+    """
+    find and parse chips, every chip is parsed only once
+    """
+
+    def __init__(self, directories: list[PathLike]):
+        self.directories = [Path(directory) for directory in directories]
+        self.chips = {}
+
+    def get(self, name: str) -> ChipDef:
+        if name not in self.chips:
+            for directory in self.directories:
+                hdl_file = directory / f"{name}.hdl"
+                if hdl_file.exists():
+                    self.chips[name] = ChipDef.parse(hdl_file.read_text())
+                    break
+            else:
+                if name in ALIASES:
+                    self.chips[name] = self.get(ALIASES[name])
+                else:
+                    raise HDLError(f"chip {name} not found")
+        return self.chips[name]
+
+
+class Netlist:
+    """
+    a chip flattened into Nand gates, DFFs and builtin parts
+
+    nets are numbered, 0 and 1 are the constants false and true
+    """
+
+    FALSE = 0
+    TRUE = 1
+
+    def __init__(self, library: Library, chip: ChipDef, models=()):
+        self.library = library
+        self.chip = chip
+        # chips simulated by their MODELS
+        self.models = set(models)
+        self.count = 2
+        self.names = {self.FALSE: "false", self.TRUE: "true"}
+        # (out, a, b)
+        self.nands = []
+        # (out, in)
+        self.dffs = []
+        # (builtin, {pin: nets} of inputs, nets of out, path)
+        self.builtins = []
+        # net -> the net driving it
+        self.alias = {}
+        # chip name -> (depth, nets of `out`), for `ARegister[]`, `RAM16K[0]`...
+        self.parts = {}
+
+        self.inputs = {
+            pin: self.bus(pin, width) for pin, width in chip.inputs.items()
+        }
+        self.outputs = {
+            pin: self.bus(pin, width) for pin, width in chip.outputs.items()
+        }
+        self.expand(chip, {**self.inputs, **self.outputs}, chip.name, 0)
+
+        self.outputs = {
+            pin: [self.resolve(net) for net in nets]
+            for pin, nets in self.outputs.items()
+        }
+
+    def bus(self, name: str, width: int) -> list[int]:
+        nets = list(range(self.count, self.count + width))
+        self.count += width
+        for i, net in enumerate(nets):
+            self.names[net] = name if width == 1 else f"{name}[{i}]"
+        return nets
+
+    def resolve(self, net: int) -> int:
+        while net in self.alias:
+            net = self.alias[net]
+        return net
+
+    def builtin(self, name: str):
+        """
+        the builtin part used for chip `name`, None if it's built from gates
+        """
+        if name in BUILTINS:
+            return BUILTINS[name]()
+        if name in self.models:
+            return MODELS[name]()
+        return None
+
+    def interface(self, name: str):
+        """
+        inputs and outputs of a chip, whatever it's made of
+        """
+        match name:
+            case "Nand":
+                return {"a": 1, "b": 1}, {"out": 1}
+            case "DFF":
+                return {"in": 1}, {"out": 1}
+        builtin = self.builtin(name)
+        if builtin is not None:
+            return builtin.inputs, builtin.outputs
+        chip = self.library.get(name)
+        return chip.inputs, chip.outputs
+
+    def expand(self, chip: ChipDef, pins: dict, path: str, depth: int):
+        """
+        pins: nets of every input and output pin of this chip instance.
+        outputs are driven by aliasing them to nets inside
+        """
+        nets = dict(pins)
+
+        def select(nets: list[int], bits, name: str) -> list[int]:
+            if bits is None:
+                return nets
+            start, end = bits
+            if end >= len(nets):
+                raise HDLError(f"{path}: {name}[{end}] out of range")
+            return nets[start : end + 1]
+
+        # 1. outputs of parts, so every internal net is known before it's used
+        instances = []
+        for index, (name, connections) in enumerate(chip.parts):
+            inputs, outputs = self.interface(name)
+            outs = {
+                pin: self.bus(f"{path}.{name}#{index}.{pin}", width)
+                for pin, width in outputs.items()
+            }
+            for pin, pin_range, net, net_range in connections:
+                if pin not in outs:
+                    continue
+                driver = select(outs[pin], pin_range, pin)
+                if net in chip.outputs:
+                    for target, source in zip(select(nets[net], net_range, net), driver):
+                        self.alias[target] = source
+                elif net in chip.inputs or net in ["true", "false"]:
+                    raise HDLError(f"{path}: can't drive {net} by {name}.{pin}")
+                elif net_range is not None:
+                    raise HDLError(f"{path}: can't subscript internal pin {net}")
+                elif net in nets:
+                    raise HDLError(f"{path}: {net} has more than one driver")
+                else:
+                    nets[net] = driver
+                    for i, bit in enumerate(driver):
+                        self.names[bit] = f"{path}.{net}" + (
+                            f"[{i}]" if len(driver) > 1 else ""
+                        )
+            instances.append((name, inputs, outs))
+
+        # 2. inputs of parts, then go deeper
+        for index, ((name, connections), (_, inputs, outs)) in enumerate(
+            zip(chip.parts, instances)
+        ):
+            ins = {pin: [self.FALSE] * width for pin, width in inputs.items()}
+            for pin, pin_range, net, net_range in connections:
+                if pin in outs:
+                    continue
+                if pin not in ins:
+                    raise HDLError(f"{path}: {name} has no pin {pin}")
+                target = select(list(range(len(ins[pin]))), pin_range, pin)
+                if net in ["true", "false"]:
+                    constant = self.TRUE if net == "true" else self.FALSE
+                    source = [constant] * len(target)
+                elif net in nets:
+                    source = select(nets[net], net_range, net)
+                else:
+                    raise HDLError(f"{path}: {net} is not driven by any part")
+                if len(source) != len(target):
+                    raise HDLError(f"{path}: width of {name}.{pin} and {net} differ")
+                for i, bit in zip(target, source):
+                    ins[pin][i] = bit
+
+            part_path = f"{path}.{name}#{index}"
+            if depth + 1 < self.parts.get(name, (depth + 2,))[0]:
+                self.parts[name] = (depth + 1, outs.get("out"), part_path)
+
+            match name:
+                case "Nand":
+                    self.nands.append((outs["out"][0], ins["a"][0], ins["b"][0]))
+                case "DFF":
+                    self.dffs.append((outs["out"][0], ins["in"][0]))
+                case _:
+                    builtin = self.builtin(name)
+                    if builtin is not None:
+                        self.builtins.append((builtin, ins, outs["out"], part_path))
+                    else:
+                        sub_chip = self.library.get(name)
+                        self.expand(sub_chip, {**ins, **outs}, part_path, depth + 1)
+
+    def finish(self):
+        """
+        resolve every alias, the netlist doesn't change after this
+        """
+        resolve = self.resolve
+        self.nands = [(resolve(o), resolve(a), resolve(b)) for o, a, b in self.nands]
+        self.dffs = [(resolve(o), resolve(i)) for o, i in self.dffs]
+        self.builtins = [
+            (
+                builtin,
+                {pin: [resolve(net) for net in nets] for pin, nets in ins.items()},
+                [resolve(net) for net in out],
+                path,
+            )
+            for builtin, ins, out, path in self.builtins
+        ]
+        self.parts = {
+            name: (depth, None if out is None else [resolve(net) for net in out], path)
+            for name, (depth, out, path) in self.parts.items()
+        }
+        return self
+
+    def compile(self, mode: str = "words"):
+        """
+        generate the evaluation function of the whole chip
+
+        mode "words": `evaluate(I, S, X)`
+            I: the value of every input pin as int
+            S: the value of every DFF
+            X: the builtin parts
+            return (outputs as int), (next value of DFFs), (inputs of builtins)
+
+        mode "bits": `evaluate(I, M)`, combinational chips only
+            I: one int per input bit, every bit of it is a row of truth table
+            M: all ones mask, as wide as the rows
+            return one int per output bit
+        """
+        return Compiler(self, mode).compile()
+
+
+class Compiler:
+    # python can't parse too deeply nested expressions
+    max_depth = 40
+
+    def __init__(self, netlist: Netlist, mode: str):
+        self.netlist = netlist
+        self.mode = mode
+        if mode == "bits" and (netlist.dffs or netlist.builtins):
+            raise HDLError(f"{netlist.chip.name} is not a combinational chip")
+
+    def simplify(self):
+        """
+        net -> expression, an expression only refers to other nets:
+
+        ("const", 0 | 1), ("var",), ("not", x), ("nand", x, y),
+        ("and", x, y), ("or", x, y)
+        """
+        expr = {Netlist.FALSE: ("const", 0), Netlist.TRUE: ("const", 1)}
+        same = {}
+
+        def find(net):
+            while net in same:
+                net = same[net]
+            return net
+
+        def negate(net):
+            x = expr[net]
+            match x:
+                case ("const", value):
+                    return ("const", 1 - value)
+                case ("not", inner):
+                    return ("same", inner)
+                case ("nand", a, b):
+                    return ("and", a, b)
+                case ("and", a, b):
+                    return ("nand", a, b)
+            return ("not", net)
+
+        def nand(a, b):
+            x, y = expr[a], expr[b]
+            if x == ("const", 0) or y == ("const", 0):
+                return ("const", 1)
+            if x == ("const", 1):
+                return negate(b)
+            if y == ("const", 1) or a == b:
+                return negate(a)
+            if x[0] == "not" and y[0] == "not":
+                return ("or", x[1], y[1])
+            return ("nand", a, b)
+
+        for net in self.sources:
+            expr[net] = ("var",)
+
+        for out in self.order:
+            _, a, b = self.gates[out]
+            result = nand(find(a), find(b))
+            if result[0] == "same":
+                same[out] = find(result[1])
+            else:
+                expr[out] = result
+        return expr, find
+
+    def sort(self):
+        """
+        topological order of the Nand gates which are needed
+        """
+        netlist = self.netlist
+        self.gates = {out: (out, a, b) for out, a, b in netlist.nands}
+        # builtin out bit -> (index, bit)
+        self.reads = {}
+        for index, (builtin, ins, out, _) in enumerate(netlist.builtins):
+            for bit, net in enumerate(out):
+                self.reads[net] = (index, bit)
+
+        self.sources = {net for nets in netlist.inputs.values() for net in nets}
+        self.sources |= {out for out, _ in netlist.dffs}
+        self.sources |= set(self.reads)
+
+        roots = [net for nets in netlist.outputs.values() for net in nets]
+        roots += [net for _, net in netlist.dffs]
+        for _, ins, _, _ in netlist.builtins:
+            roots += [net for nets in ins.values() for net in nets]
+
+        order = []
+        done = set()
+        visiting = set()
+        for root in roots:
+            stack = [(root, False)]
+            while stack:
+                net, expanded = stack.pop()
+                if expanded:
+                    visiting.discard(net)
+                    done.add(net)
+                    if net in self.gates:
+                        order.append(net)
+                    continue
+                if net in done:
+                    continue
+                if net in visiting:
+                    name = netlist.names.get(net, net)
+                    raise HDLError(f"combinational loop through {name}")
+                visiting.add(net)
+                stack.append((net, True))
+                if net in self.gates:
+                    _, a, b = self.gates[net]
+                    stack += [(b, False), (a, False)]
+                elif net in self.reads:
+                    builtin, ins, _, _ = netlist.builtins[self.reads[net][0]]
+                    for pin in builtin.reads:
+                        stack += [(bit, False) for bit in ins[pin]]
+        self.order = order
+
+    def compile(self):
+        netlist = self.netlist
+        self.sort()
+        expr, find = self.simplify()
+
+        lines = []
+        names = {}
+
+        def word(nets: list[int]) -> str:
+            if not nets:
+                return "0"
+            return " | ".join(
+                text(net) if i == 0 else f"{text(net)} << {i}"
+                for i, net in enumerate(nets)
+            )
+
+        uses = defaultdict(int)
+        roots = set()
+
+        def use(net):
+            uses[find(net)] += 1
+
+        for out in self.order:
+            x = expr.get(out)
+            if x is not None and x[0] in ["not", "nand", "and", "or"]:
+                for net in x[1:]:
+                    use(net)
+        for nets in netlist.outputs.values():
+            for net in nets:
+                use(net)
+                roots.add(find(net))
+        for _, net in netlist.dffs:
+            use(net)
+            roots.add(find(net))
+        for builtin, ins, _, _ in netlist.builtins:
+            for nets in ins.values():
+                for net in nets:
+                    use(net)
+                    roots.add(find(net))
+
+        depths = {}
+
+        def text(net) -> str:
+            net = find(net)
+            if net in names:
+                return names[net]
+            x = expr.get(net, ("const", 0))
+            match x:
+                case ("const", 1):
+                    return "M"
+                case ("const", 0):
+                    return "0"
+            raise HDLError(f"net {netlist.names.get(net, net)} used before defined")
+
+        def define(net):
+            """
+            emit the expression of a net, as a local variable,
+            or keep it as text if it's used only once
+            """
+            x = expr[net]
+            args = [text(arg) for arg in x[1:]]
+            depth = 1 + max((depths.get(find(arg), 0) for arg in x[1:]), default=0)
+            match x[0]:
+                case "not":
+                    code = f"({args[0]} ^ M)"
+                case "nand":
+                    code = f"(({args[0]} & {args[1]}) ^ M)"
+                case "and":
+                    code = f"({args[0]} & {args[1]})"
+                case "or":
+                    code = f"({args[0]} | {args[1]})"
+            if uses[net] == 1 and net not in roots and depth < self.max_depth:
+                names[net] = code
+                depths[net] = depth
+            else:
+                names[net] = f"n{net}"
+                lines.append(f"    n{net} = {code}")
+
+        # inputs
+        if self.mode == "words":
+            pins = list(netlist.inputs)
+            if pins:
+                lines.append(f"    {', '.join(f'p_{i}' for i in range(len(pins)))}, = I")
+            for i, pin in enumerate(pins):
+                for bit, net in enumerate(netlist.inputs[pin]):
+                    if uses[net]:
+                        names[net] = f"n{net}"
+                        lines.append(f"    n{net} = p_{i} >> {bit} & 1")
+            for index, (out, _) in enumerate(netlist.dffs):
+                names[out] = f"n{out}"
+                lines.append(f"    n{out} = S[{index}]")
+        else:
+            bits = [net for nets in netlist.inputs.values() for net in nets]
+            for net in bits:
+                names[net] = f"n{net}"
+            if bits:
+                lines.append(f"    {', '.join(f'n{net}' for net in bits)}, = I")
+
+        # builtins are read right before the first gate needs them
+        pending = defaultdict(list)
+        for net, (index, bit) in self.reads.items():
+            pending[index].append((bit, net))
+
+        def read(index):
+            builtin, ins, out, _ = netlist.builtins[index]
+            args = ", ".join(word(ins[pin]) for pin in builtin.reads)
+            lines.append(f"    v_{index} = X[{index}].read({args})")
+            for bit, net in pending.pop(index):
+                names[net] = f"n{net}"
+                lines.append(f"    n{net} = v_{index} >> {bit} & 1")
+
+        def ready(index):
+            builtin, ins, _, _ = netlist.builtins[index]
+            return all(
+                find(net) in names or expr.get(find(net), ("const",))[0] == "const"
+                for pin in builtin.reads
+                for net in ins[pin]
+            )
+
+        def flush():
+            for index in list(pending):
+                if ready(index):
+                    read(index)
+
+        flush()
+        for out in self.order:
+            if find(out) != out or out in names:
+                continue
+            x = expr[out]
+            if x[0] == "const":
+                continue
+            for arg in x[1:]:
+                if find(arg) not in names and find(arg) in self.reads:
+                    read(self.reads[find(arg)][0])
+            define(out)
+            flush()
+        for index in list(pending):
+            read(index)
+
+        if self.mode == "words":
+            outputs = [word(nets) for nets in netlist.outputs.values()]
+            state = [text(net) for _, net in netlist.dffs]
+            builtins = [
+                "(" + "".join(f"{word(nets)}, " for nets in ins.values()) + ")"
+                for _, ins, _, _ in netlist.builtins
+            ]
+            lines.append(f"    return ({''.join(f'{o}, ' for o in outputs)}), (")
+            lines.append(f"        {''.join(f'{s}, ' for s in state)}), (")
+            lines.append(f"        {''.join(f'{b}, ' for b in builtins)})")
+            source = "def evaluate(I, S, X, M=1):\n" + "\n".join(lines) + "\n"
+        else:
+            outputs = [text(net) for nets in netlist.outputs.values() for net in nets]
+            lines.append(f"    return ({''.join(f'{o}, ' for o in outputs)})")
+            source = "def evaluate(I, M):\n" + "\n".join(lines) + "\n"
+
+        scope = {}
+        exec(compile(source, f"<{netlist.chip.name}>", "exec"), scope)
+        evaluate = scope["evaluate"]
+        evaluate.source = source
+        return evaluate
+
+
+def load(hdl_file: PathLike, directories: list[PathLike] = None, models=()) -> Netlist:
+    """
+    flatten a chip, its sub chips are searched in its own directory first
+    """
+    hdl_file = Path(hdl_file)
+    if directories is None:
+        directories = [hdl_file.parent] + CHAPTERS
+    library = Library(directories)
+    chip = ChipDef.parse(hdl_file.read_text())
+    return Netlist(library, chip, models).finish()
+
+
+class Chip:
+    """
+    a compiled chip, driven like in the HardwareSimulator
+
+    chip["a"] = 1
+    chip.eval()
+    chip["out"]
+    """
+
+    def __init__(self, netlist: Netlist):
+        self.netlist = netlist
+        self.evaluate = netlist.compile()
+        self.pins = {pin: 0 for pin in netlist.inputs}
+        self.values = {pin: 0 for pin in netlist.outputs}
+        self.widths = {pin: len(nets) for pin, nets in netlist.inputs.items()}
+        self.widths |= {pin: len(nets) for pin, nets in netlist.outputs.items()}
+        self.builtins = [builtin for builtin, _, _, _ in netlist.builtins]
+        self.state = [0] * len(netlist.dffs)
+        self.pending = self.state
+        self.next_state = self.state
+        self.builtin_inputs = []
+        self.state_index = {out: i for i, (out, _) in enumerate(netlist.dffs)}
+        self.time = 0
+        self.ticked = False
+        # the last `eval` is out of date
+        self.dirty = True
+        self.eval()
+
+    def __setitem__(self, pin: str, value: int):
+        if pin not in self.pins:
+            raise HDLError(f"{pin} is not an input pin")
+        self.pins[pin] = value & ((1 << self.widths[pin]) - 1)
+        self.dirty = True
+
+    def __getitem__(self, pin: str) -> int:
+        if pin in self.pins:
+            return self.pins[pin]
+        if pin in self.values:
+            return self.values[pin]
+        raise HDLError(f"no pin {pin}")
+
+    def part(self, name: str):
+        """
+        the builtin part, or nets of `out` of the part named `name`
+        """
+        if name not in self.netlist.parts:
+            raise HDLError(f"no part {name}")
+        # a builtin part may be changed by the caller, e.g. ROM32K.load()
+        self.dirty = True
+        _, out, path = self.netlist.parts[name]
+        for builtin, _, _, builtin_path in self.netlist.builtins:
+            if builtin_path == path:
+                return builtin
+        return out
+
+    def part_value(self, name: str, index: int = None) -> int:
+        """
+        `ARegister[]`, `RAM16K[3]`
+        """
+        part = self.part(name)
+        if isinstance(part, Builtin):
+            return part.sampled() if index is None else part[index]
+        if index not in [None, 0] or part is None:
+            raise HDLError(f"{name}[{index}] needs the builtin {name}")
+        value = 0
+        for bit, net in enumerate(part):
+            if net == Netlist.TRUE:
+                value |= 1 << bit
+            elif net in self.state_index:
+                # like the builtin registers, show the value sampled by `tick`
+                value |= self.pending[self.state_index[net]] << bit
+            elif net != Netlist.FALSE:
+                raise HDLError(f"{name}[] is not a register")
+        return value
+
+    def set_part(self, name: str, index: int, value: int):
+        part = self.part(name)
+        if not isinstance(part, Builtin) or index is None:
+            raise HDLError(f"can't set {name}[{index}], it's not a builtin memory")
+        part[index] = value & 0xFFFF
+
+    def eval(self):
+        outputs, self.next_state, self.builtin_inputs = self.evaluate(
+            list(self.pins.values()), self.state, self.builtins
+        )
+        self.values = dict(zip(self.values, outputs))
+        self.dirty = False
+
+    def tick(self):
+        """
+        the rising edge: DFFs and memories sample their inputs
+        """
+        # nothing changed since `tock`, which evaluated the chip already
+        if self.dirty:
+            self.eval()
+        self.pending = self.next_state
+        for builtin, inputs in zip(self.builtins, self.builtin_inputs):
+            builtin.tick(*inputs)
+        self.ticked = True
+
+    def tock(self):
+        """
+        the falling edge: the sampled values show up at the outputs
+        """
+        self.state = list(self.pending)
+        for builtin in self.builtins:
+            builtin.tock()
+        self.time += 1
+        self.ticked = False
+        self.eval()
+
+
+# `repeat {` without a count runs until the user stops the simulator,
+# headless it stops here, with an error
+REPEAT = 100_000
+
+
+class Script:
+    """
+    runs a `.tst` script, see Appendix B
+    """
+
+    def __init__(
+        self,
+        tst_file: PathLike,
+        directories: list[PathLike] = None,
+        models=(),
+        keys: list[int] = (),
+    ):
+        self.tst_file = Path(tst_file)
+        self.directories = directories
+        self.models = models
+        # keys held down one after another, each one
+        # while a `while` loop is waiting for the user
+        self.keys = list(keys)
+        self.chip = None
+        self.columns = []
+        self.lines = []
+        self.compare_to = None
+        self.output_file = None
+
+    @staticmethod
+    def parse(text: str) -> list:
+        """
+        commands, `repeat` and `while` have their body as the last item
+        """
+        text = re.sub(r"/\*.*?\*/", " ", text, flags=re.DOTALL)
+        text = re.sub(r"//[^\n]*", " ", text)
+        tokens = re.findall(r'(?:"[^"]*"|[^,;{}"\s])(?:"[^"]*"|[^,;{}"])*|[{}]', text)
+        tokens.reverse()
+
+        def block():
+            commands = []
+            while tokens:
+                token = tokens.pop().strip()
+                if token == "}":
+                    return commands
+                if token == "{":
+                    raise HDLError("unexpected {")
+                words = token.split()
+                if tokens and tokens[-1] == "{":
+                    tokens.pop()
+                    words.append(block())
+                commands.append(words)
+            return commands
+
+        return block()
+
+    @staticmethod
+    def value(text: str) -> int:
+        """
+        %B101, %X1F, %D-1, -1
+        """
+        match text[:2]:
+            case "%B":
+                return int(text[2:], 2)
+            case "%X":
+                return int(text[2:], 16)
+            case "%D":
+                return int(text[2:])
+        return int(text)
+
+    def read(self, name: str) -> int:
+        if name == "time":
+            return self.chip.time
+        part = re.fullmatch(r"(\w+)\[(\d*)\]", name)
+        if part:
+            index = part[2]
+            return self.chip.part_value(part[1], int(index) if index else None)
+        return self.chip[name]
+
+    def format(self, name: str, spec: str) -> str:
+        kind, pad_left, width, pad_right = re.fullmatch(
+            r"%([BDXS])(\d+)\.(\d+)\.(\d+)", spec
+        ).groups()
+        pad_left, width, pad_right = int(pad_left), int(width), int(pad_right)
+        if name == "time":
+            text = f"{self.chip.time}{'+' if self.chip.ticked else ''}".ljust(width)
+        else:
+            value = self.read(name)
+            match kind:
+                case "B":
+                    text = format(value, f"0{width}b")[-width:]
+                case "X":
+                    text = format(value, f"0{width}X")[-width:]
+                case "D":
+                    bits = self.chip.widths.get(name, 16)
+                    if bits == 16 and value & 0x8000:
+                        value -= 0x10000
+                    text = str(value).rjust(width)
+                case "S":
+                    text = str(value).ljust(width)
+        return " " * pad_left + text + " " * pad_right
+
+    def output_list(self, columns: list[str]):
+        self.columns = []
+        header = []
+        for column in columns:
+            name, spec = column.split("%")
+            self.columns.append((name, "%" + spec))
+            pad_left, width, pad_right = map(int, spec[1:].split("."))
+            width += pad_left + pad_right
+            name = name[:width]
+            left = (width - len(name)) // 2
+            header.append(" " * left + name + " " * (width - len(name) - left))
+        self.lines.append("|" + "|".join(header) + "|")
+
+    def output(self):
+        columns = [self.format(name, spec) for name, spec in self.columns]
+        self.lines.append("|" + "|".join(columns) + "|")
+
+    def condition(self, words: list[str]) -> bool:
+        name, operator, value = words
+        left, right = self.read(name), self.value(value)
+        match operator:
+            case "=":
+                return left == right
+            case "<>":
+                return left != right
+            case "<":
+                return left < right
+            case ">":
+                return left > right
+            case "<=":
+                return left <= right
+            case ">=":
+                return left >= right
+        raise HDLError(f"unknown operator {operator}")
+
+    def execute(self, commands: list):
+        folder = self.tst_file.parent
+        for words in commands:
+            match words:
+                case ["load", hdl_file]:
+                    netlist = load(folder / hdl_file, self.directories, self.models)
+                    self.chip = Chip(netlist)
+                case ["output-file", name]:
+                    self.output_file = folder / name
+                case ["compare-to", name]:
+                    self.compare_to = folder / name
+                case ["output-list", *columns]:
+                    self.output_list(columns)
+                case ["set", name, value]:
+                    part = re.fullmatch(r"(\w+)\[(\d*)\]", name)
+                    if part:
+                        index = int(part[2]) if part[2] else None
+                        self.chip.set_part(part[1], index, self.value(value))
+                    else:
+                        self.chip[name] = self.value(value)
+                case ["eval"]:
+                    self.chip.eval()
+                case ["output"]:
+                    self.output()
+                case ["tick"]:
+                    self.chip.tick()
+                case ["tock"]:
+                    self.chip.tock()
+                case [part, "load", hack_file]:
+                    self.chip.part(part).load(folder / hack_file)
+                case ["repeat", body]:
+                    for _ in range(REPEAT):
+                        self.execute(body)
+                    raise HDLError(
+                        f"repeat {{ never ends, stopped after {REPEAT:,} times"
+                    )
+                case ["repeat", times, body]:
+                    for _ in range(int(times)):
+                        self.execute(body)
+                case ["while", *condition, body]:
+                    self.press()
+                    if not self.keys and self.condition(condition):
+                        if self.reads_keyboard(condition[0]):
+                            raise HDLError(
+                                f"while {' '.join(condition)} waits for a key,"
+                                " needs --key"
+                            )
+                    while self.condition(condition):
+                        self.execute(body)
+                    if self.keys:
+                        self.keys.pop(0)
+                    self.release()
+                case ["echo", *_] | ["clear-echo"]:
+                    pass
+                case _:
+                    raise HDLError(f"unknown command {' '.join(map(str, words))}")
+
+    def press(self):
+        if self.keys and "Keyboard" in self.chip.netlist.parts:
+            self.chip.part("Keyboard").key = self.keys[0]
+
+    def reads_keyboard(self, name: str) -> bool:
+        """
+        whether `name` shows the key held down, by holding one
+        """
+        if "Keyboard" not in self.chip.netlist.parts:
+            return False
+        keyboard = self.chip.part("Keyboard")
+        before = self.read(name)
+        keyboard.key = 0x7FFF
+        self.chip.eval()
+        after = self.read(name)
+        keyboard.key = 0
+        self.chip.eval()
+        return before != after
+
+    def release(self):
+        if "Keyboard" in self.chip.netlist.parts:
+            self.chip.part("Keyboard").key = 0
+
+    def compare(self) -> str:
+        """
+        None if the output matches the .cmp file, `*` matches any char.
+        otherwise the first line differs
+        """
+        if self.compare_to is None:
+            return None
+        expected = self.compare_to.read_text().splitlines()
+        for number, (line, cmp) in enumerate(zip(self.lines, expected), 1):
+            cmp = cmp.rstrip()
+            if len(line) != len(cmp) or any(
+                c != "*" and c != o for o, c in zip(line, cmp)
+            ):
+                return f"comparison failure at line {number}:\n{cmp}\n{line}"
+        if len(self.lines) < len(expected):
+            return f"comparison failure: {len(self.lines)} of {len(expected)} lines"
+        return None
+
+    def run(self, write_output: bool = False) -> str:
+        self.execute(self.parse(self.tst_file.read_text()))
+        if write_output and self.output_file is not None:
+            self.output_file.write_text("\n".join(self.lines) + "\n")
+        return self.compare()
+
+
+def cross_check(
+    name: str,
+    models=MODELS,
+    directories: list[PathLike] = None,
+    steps: int = 300,
+    seed: int = 0,
+) -> str:
+    """
+    drive the model of chip `name` and its gates with the same random inputs,
+    None if their outputs agree at every step.
+
+    parts inside the chip use their models as well, so every level of
+    RAM8 -> RAM16K is checked on its own, and RAM16K costs as little as RAM8
+    """
+    import random
+
+    library = Library(directories or CHAPTERS)
+    chip = library.get(name)
+    gates = Chip(Netlist(library, chip, set(models) - {name}).finish())
+    pins = [(pin, None, pin, None) for pin in [*chip.inputs, *chip.outputs]]
+    wrapper = ChipDef(name, chip.inputs, chip.outputs, [(name, pins)])
+    model = Chip(Netlist(library, wrapper, {name}).finish())
+
+    generator = random.Random(seed)
+    # reuse a few addresses, so reads hit what was written
+    addresses = [generator.getrandbits(chip.inputs.get("address", 0)) for _ in range(8)]
+    chances = {"load": 0.5, "inc": 0.5, "reset": 0.1}
+    for step in range(steps):
+        for pin, width in chip.inputs.items():
+            if pin == "address":
+                value = generator.choice(addresses)
+            elif width == 1:
+                value = int(generator.random() < chances.get(pin, 0.5))
+            else:
+                value = generator.getrandbits(width)
+            gates[pin] = model[pin] = value
+        for clock in ["eval", "tick", "tock"]:
+            getattr(gates, clock)()
+            getattr(model, clock)()
+            if gates.values != model.values:
+                return f"step {step} {clock}: {gates.pins} -> {gates.values}, model {model.values}"
+    return None
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    import time
+
+    parser = argparse.ArgumentParser(description="run .tst scripts without java")
+    parser.add_argument("tst_files", type=Path, nargs="*")
+    parser.add_argument("--write-output", action="store_true", help="write .out files")
+    parser.add_argument(
+        "--fast",
+        nargs="*",
+        metavar="CHIP",
+        help=f"use models instead of gates, for all of {', '.join(MODELS)} by default",
+    )
+    parser.add_argument(
+        "--cross-check",
+        action="store_true",
+        help="check the models against their gates first",
+    )
+    parser.add_argument(
+        "--key",
+        action="append",
+        default=[],
+        help="a key held down, for scripts waiting for the keyboard, repeatable",
+    )
+    args = parser.parse_args()
+
+    models = []
+    if args.fast is not None:
+        models = args.fast or list(MODELS)
+        for name in models:
+            if name not in MODELS:
+                parser.error(f"no model for {name}")
+    keys = [ord(key) if len(key) == 1 else int(key) for key in args.key]
+
+    failed = 0
+    if args.cross_check:
+        for name in models or MODELS:
+            start = time.perf_counter()
+            try:
+                failure = cross_check(name)
+            except HDLError as error:
+                failure = f"error: {error}"
+            elapsed = (time.perf_counter() - start) * 1000
+            status = "ok" if failure is None else "FAIL"
+            print(f"{status:<4} model {name} ({elapsed:.1f}ms)")
+            if failure is not None:
+                print(failure)
+                failed += 1
+
+    for tst_file in args.tst_files:
+        start = time.perf_counter()
+        try:
+            failure = Script(tst_file, None, models, keys).run(args.write_output)
+        except HDLError as error:
+            failure = f"error: {error}"
+        elapsed = (time.perf_counter() - start) * 1000
+        status = "ok" if failure is None else "FAIL"
+        print(f"{status:<4} {tst_file} ({elapsed:.1f}ms)")
+        if failure is not None:
+            print(failure)
+            failed += 1
+    sys.exit(1 if failed else 0)
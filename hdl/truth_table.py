@@ -0,0 +1,211 @@
+"""
+reference
+
+see 2.2.2 Arithmetic Logic Unit
+
+check a combinational chip against a reference model, on all its rows at once.
+
+rows are packed bit-parallel: every input bit of the chip is a python int,
+whose n-th bit is that input bit in the n-th row.
+so a Nand gate is a single `(a & b) ^ M` over every row of the truth table.
+
+chips with at most `--max-bits` input bits are checked exhaustively,
+bigger ones (ALU, Add16) enumerate every narrow pin (control bits, sel)
+and cross them with edge cases and random values of the wide pins.
+"""
+
+import random
+from itertools import product
+from os import PathLike
+from pathlib import Path
+
+from hdl_simulator import HDLError, Netlist, load
+
+WORD = 0xFFFF
+
+# wide pins get these values first, then random ones
+EDGE_CASES = [0, 1, 2, WORD, 0x7FFF, 0x8000, 0x5555, 0xAAAA]
+
+
+def alu(p: dict) -> dict:
+    x = 0 if p["zx"] else p["x"]
+    x = x ^ WORD if p["nx"] else x
+    y = 0 if p["zy"] else p["y"]
+    y = y ^ WORD if p["ny"] else y
+    out = (x + y) & WORD if p["f"] else x & y
+    out = out ^ WORD if p["no"] else out
+    return {"out": out, "zr": int(out == 0), "ng": out >> 15}
+
+
+def dmux(p: dict, ways: int) -> dict:
+    return {"abcdefgh"[i]: p["in"] if p["sel"] == i else 0 for i in range(ways)}
+
+
+# chip name -> the function of one row, {pin: value} in, {pin: value} out
+REFERENCES = {
+    "Not": lambda p: {"out": p["in"] ^ 1},
+    "And": lambda p: {"out": p["a"] & p["b"]},
+    "Or": lambda p: {"out": p["a"] | p["b"]},
+    "Xor": lambda p: {"out": p["a"] ^ p["b"]},
+    "Mux": lambda p: {"out": p["b"] if p["sel"] else p["a"]},
+    "DMux": lambda p: dmux(p, 2),
+    "DMux4Way": lambda p: dmux(p, 4),
+    "DMux8Way": lambda p: dmux(p, 8),
+    "Not16": lambda p: {"out": p["in"] ^ WORD},
+    "And16": lambda p: {"out": p["a"] & p["b"]},
+    "Or16": lambda p: {"out": p["a"] | p["b"]},
+    "Mux16": lambda p: {"out": p["b"] if p["sel"] else p["a"]},
+    "Mux4Way16": lambda p: {"out": p["abcd"[p["sel"]]]},
+    "Mux8Way16": lambda p: {"out": p["abcdefgh"[p["sel"]]]},
+    "Or8Way": lambda p: {"out": int(p["in"] != 0)},
+    "Or16Way": lambda p: {"out": int(p["in"] != 0)},
+    "HalfAdder": lambda p: {"sum": p["a"] ^ p["b"], "carry": p["a"] & p["b"]},
+    "FullAdder": lambda p: {
+        "sum": p["a"] ^ p["b"] ^ p["c"],
+        "carry": (p["a"] + p["b"] + p["c"]) >> 1,
+    },
+    "Add16": lambda p: {"out": (p["a"] + p["b"]) & WORD},
+    "Inc16": lambda p: {"out": (p["in"] + 1) & WORD},
+    "ALU": alu,
+}
+
+
+def pack(values: list[int], width: int) -> list[int]:
+    """
+    transpose: one value per row -> one int per bit, bit n of it is row n
+    """
+    columns = []
+    for bit in range(width):
+        column = "".join("1" if value >> bit & 1 else "0" for value in reversed(values))
+        columns.append(int(column, 2))
+    return columns
+
+
+def unpack(columns: list[int], row: int) -> int:
+    return sum((column >> row & 1) << bit for bit, column in enumerate(columns))
+
+
+def rows(widths: dict[str, int], max_bits: int, samples: int, seed: int) -> dict:
+    """
+    pin -> its value in every row
+    """
+    if sum(widths.values()) <= max_bits:
+        narrow, wide = list(widths), []
+    else:
+        narrow = [pin for pin, width in widths.items() if width <= 4]
+        wide = [pin for pin in widths if pin not in narrow]
+
+    generator = random.Random(seed)
+    operands = []
+    for i in range(samples):
+        values = []
+        for pin in wide:
+            width = widths[pin]
+            if i < len(EDGE_CASES) ** len(wide):
+                # every combination of edge cases first
+                index = i // len(EDGE_CASES) ** wide.index(pin) % len(EDGE_CASES)
+                values.append(EDGE_CASES[index] & ((1 << width) - 1))
+            else:
+                values.append(generator.getrandbits(width))
+        operands.append(values)
+        if not wide:
+            break
+
+    table = {pin: [] for pin in widths}
+    ranges = [range(1 << widths[pin]) for pin in narrow]
+    for control in product(*ranges):
+        for values in operands:
+            for pin, value in zip(narrow, control):
+                table[pin].append(value)
+            for pin, value in zip(wide, values):
+                table[pin].append(value)
+    return table
+
+
+def evaluate(netlist: Netlist, table: dict[str, list[int]], count: int) -> dict:
+    """
+    evaluate every row at once, pin -> list of output columns
+    """
+    evaluate = netlist.compile("bits")
+    inputs = []
+    for pin, nets in netlist.inputs.items():
+        inputs += pack(table[pin], len(nets))
+    bits = iter(evaluate(inputs, (1 << count) - 1))
+    return {
+        pin: [next(bits) for _ in nets] for pin, nets in netlist.outputs.items()
+    }
+
+
+def check(
+    hdl_file: PathLike,
+    against: PathLike = None,
+    max_bits: int = 16,
+    samples: int = 256,
+    seed: int = 0,
+) -> str:
+    """
+    None if the chip agrees with its reference on every row,
+    otherwise the first row differs
+    """
+    netlist = load(hdl_file)
+    name = netlist.chip.name
+    widths = {pin: len(nets) for pin, nets in netlist.inputs.items()}
+    table = rows(widths, max_bits, samples, seed)
+    count = len(next(iter(table.values()))) if table else 1
+
+    actual = evaluate(netlist, table, count)
+    if against is not None:
+        expected = evaluate(load(against), table, count)
+    elif name in REFERENCES:
+        model = REFERENCES[name]
+        results = [model(dict(zip(table, row))) for row in zip(*table.values())]
+        expected = {
+            pin: pack([result[pin] for result in results], len(nets))
+            for pin, nets in netlist.outputs.items()
+        }
+    else:
+        raise HDLError(f"no reference model for {name}, try --against")
+
+    for pin, columns in actual.items():
+        if pin not in expected:
+            raise HDLError(f"the reference has no output {pin}")
+        differ = 0
+        for got, want in zip(columns, expected[pin]):
+            differ |= got ^ want
+        if differ:
+            row = (differ & -differ).bit_length() - 1
+            inputs = " ".join(f"{p}={table[p][row]}" for p in table)
+            got, want = unpack(columns, row), unpack(expected[pin], row)
+            return f"row {row}: {inputs} -> {pin}={got}, expect {want}"
+    return None
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    import time
+
+    parser = argparse.ArgumentParser(description="check combinational chips")
+    parser.add_argument("hdl_files", type=Path, nargs="+")
+    parser.add_argument("--against", type=Path, help="another chip as reference")
+    parser.add_argument("--max-bits", type=int, default=16, help="exhaustive below")
+    parser.add_argument("--samples", type=int, default=256, help="values of wide pins")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    failed = 0
+    for hdl_file in args.hdl_files:
+        start = time.perf_counter()
+        try:
+            failure = check(
+                hdl_file, args.against, args.max_bits, args.samples, args.seed
+            )
+        except HDLError as error:
+            failure = f"error: {error}"
+        elapsed = (time.perf_counter() - start) * 1000
+        status = "ok" if failure is None else "FAIL"
+        print(f"{status:<4} {hdl_file} ({elapsed:.1f}ms)")
+        if failure is not None:
+            print(failure)
+            failed += 1
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,235 @@
+"""
+the classes of `12 Operating System` on the emulator, see benchmarks/os_cycles.py
+
+    python -m pytest tests
+
+the course tests, then small programs which store results for python to
+check: every value, every heap block, every pixel.
+"""
+
+import math
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import os_cycles
+from hack_machine import signed
+from screen import HEIGHT, ROW_BYTES, WIDTH
+
+RESULTS = 8000
+# the classes a test which doesn't draw needs
+ARRAY = ["Memory", "Math", "Array"]
+
+
+@pytest.mark.parametrize("test", os_cycles.CLASSES)
+def test_course(test):
+    result = os_cycles.run(os_cycles.TESTS / test, os_cycles.CLASSES[test])
+    assert os_cycles.check(test, result) == "ok"
+
+
+def test_course_screen_checked():
+    # a blank screen is not the picture of ScreenTest, nor of OutputTest
+    for test in ["ScreenTest", "OutputTest"]:
+        result = os_cycles.run(os_cycles.TESTS / "ArrayTest", ARRAY)
+        assert os_cycles.check(test, result).startswith("screen differs")
+
+
+def run(tmp_path: Path, main: str, classes: list[str]) -> dict:
+    """
+    run a Main.jack with a main function of the given body, which keeps its
+    results in RAM[8000..]
+    """
+    (tmp_path / "Main.jack").write_text(
+        "class Main {\n    function void main() {\n"
+        + main
+        + "\n        return;\n    }\n}\n"
+    )
+    result = os_cycles.run(tmp_path, classes)
+    assert result["halted"]
+    assert result["error"] == 0
+    return result
+
+
+def results(result: dict, count: int) -> list[int]:
+    ram = result["machine"].ram
+    return [signed(value) for value in ram[RESULTS : RESULTS + count]]
+
+
+def truncate(x: int, y: int) -> int:
+    # jack division rounds towards 0, python's floor division down
+    quotient = abs(x) // abs(y)
+    return quotient if (x < 0) == (y < 0) else -quotient
+
+
+def wrap(value: int) -> int:
+    return signed(value & 0xFFFF)
+
+
+# -32768 can't be written in jack, it's -32767 - 1
+SMALLEST = -32768
+
+
+def jack(value: int) -> str:
+    return "(-32767 - 1)" if value == SMALLEST else f"({value})"
+
+
+def test_math(tmp_path):
+    products = [(7, -9), (-181, 181), (255, 128), (300, 300), (-1, -1), (0, 12345)]
+    products += [(SMALLEST, -1), (SMALLEST, 1), (32767, 32767), (-2, 16384)]
+    quotients = [(32767, 1), (-32767, 7), (100, -7), (-100, -7), (7, 100)]
+    quotients += [(SMALLEST, 2), (SMALLEST, -3), (SMALLEST, SMALLEST), (5, SMALLEST)]
+    quotients += [(SMALLEST, 32767), (32767, -32767), (-1, 1), (16384, 3)]
+    roots = [0, 1, 2, 3, 4, 15, 16, 10000, 16383, 32761, 32767]
+    pairs = [(-32767, 32767), (SMALLEST, 32767), (5, -5), (-3, -4), (100, 99)]
+
+    main = ["        var Array r;", f"        let r = {RESULTS};"]
+    expected = []
+    for x, y in products:
+        main.append(f"        let r[{len(expected)}] = {jack(x)} * {jack(y)};")
+        expected.append(wrap(x * y))
+    for x, y in quotients:
+        main.append(f"        let r[{len(expected)}] = {jack(x)} / {jack(y)};")
+        expected.append(wrap(truncate(x, y)))
+    for x in roots:
+        main.append(f"        let r[{len(expected)}] = Math.sqrt({x});")
+        expected.append(math.isqrt(x))
+    for x, y in pairs:
+        for function in [min, max]:
+            call = f"Math.{function.__name__}({jack(x)}, {jack(y)})"
+            main.append(f"        let r[{len(expected)}] = {call};")
+            expected.append(function(x, y))
+    for x in [0, 27, -27, 32767, -32767]:
+        main.append(f"        let r[{len(expected)}] = Math.abs({x});")
+        expected.append(abs(x))
+
+    result = run(tmp_path, "\n".join(main), ARRAY)
+    assert results(result, len(expected)) == expected
+
+
+def test_memory(tmp_path):
+    # the heap is 2048..16383, RAM[8000..] too: all of these stay below it
+    sizes = [1, 2, 3, 5, 16, 17, 100, 1000, 0, 2]
+    main = [
+        "        var Array r, block;",
+        "        var int i, j;",
+        f"        let r = {RESULTS};",
+    ]
+    # the sizes, for the loop which fills the blocks, at 8020..
+    for index, size in enumerate(sizes):
+        main.append(f"        do Memory.poke({RESULTS + 20 + index}, {size});")
+    for index, size in enumerate(sizes):
+        main.append(f"        let r[{index}] = Memory.alloc({size});")
+    main += [
+        # blocks which come and go, more than the heap holds at once
+        "        while (i < 200) {",
+        "            let block = Memory.alloc(3000);",
+        "            let block[2999] = i;",
+        "            do Memory.deAlloc(block);",
+        "            let i = i + 1;",
+        "        }",
+        # and small ones freed in between
+        "        let i = 0;",
+        "        while (i < 30) {",
+        "            let block = Memory.alloc(i);",
+        "            do Memory.deAlloc(r[3]);",
+        "            let r[3] = block;",
+        "            let i = i + 1;",
+        "        }",
+        f"        do Memory.poke({RESULTS + 23}, 29);",
+        # every block, filled with its number
+        "        let i = 0;",
+        f"        while (i < {len(sizes)}) {{",
+        "            let block = r[i];",
+        "            let j = 0;",
+        f"            while (j < Memory.peek({RESULTS + 20} + i)) {{",
+        "                let block[j] = i;",
+        "                let j = j + 1;",
+        "            }",
+        "            let i = i + 1;",
+        "        }",
+    ]
+    # r[3] is the last of the small blocks now
+    sizes[3] = 29
+
+    result = run(tmp_path, "\n".join(main), ARRAY)
+    ram = result["machine"].ram
+    blocks = sorted(zip(results(result, len(sizes)), sizes, range(len(sizes))))
+    ends = [start for start, _, _ in blocks[1:]] + [RESULTS]
+    for (start, size, index), end in zip(blocks, ends):
+        assert 2048 <= start and start + size <= end, "blocks overlap"
+        assert ram[start : start + size] == [index] * size
+
+
+def test_screen(tmp_path):
+    expected = [[0] * WIDTH for _ in range(HEIGHT)]
+
+    def fill(x1: int, y1: int, x2: int, y2: int, color: int = 1):
+        for y in range(y1, y2 + 1):
+            expected[y][x1 : x2 + 1] = [color] * (x2 - x1 + 1)
+
+    main = []
+    for x1, y1, x2, y2 in [(3, 5, 40, 9), (100, 100, 100, 100), (17, 30, 47, 31)]:
+        main.append(f"        do Screen.drawRectangle({x1}, {y1}, {x2}, {y2});")
+        fill(x1, y1, x2, y2)
+    main.append("        do Screen.drawRectangle(480, 200, 511, 255);")
+    fill(480, 200, 511, 255)
+    main.append("        do Screen.setColor(false);")
+    main.append("        do Screen.drawRectangle(10, 6, 20, 7);")
+    fill(10, 6, 20, 7, 0)
+    main.append("        do Screen.drawPixel(495, 230);")
+    fill(495, 230, 495, 230, 0)
+    main.append("        do Screen.setColor(true);")
+    for x, y in [(0, 255), (511, 0), (33, 77)]:
+        main.append(f"        do Screen.drawPixel({x}, {y});")
+        fill(x, y, x, y)
+    # horizontal and vertical lines, either way round
+    for x1, y1, x2, y2 in [(5, 50, 300, 50), (300, 52, 5, 52), (60, 60, 60, 90)]:
+        main.append(f"        do Screen.drawLine({x1}, {y1}, {x2}, {y2});")
+        fill(min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+    main.append("        do Screen.drawLine(61, 90, 61, 60);")
+    fill(61, 60, 61, 90)
+    # circles are rows of half width sqrt(r^2 - dy^2)
+    for x, y, r in [(400, 100, 30), (450, 30, 0), (30, 200, 25), (255, 181, 74)]:
+        main.append(f"        do Screen.drawCircle({x}, {y}, {r});")
+        for dy in range(-r, r + 1):
+            half = math.isqrt(r * r - dy * dy)
+            fill(x - half, y + dy, x + half, y + dy)
+
+    result = run(tmp_path, "\n".join(main), ARRAY + ["Screen"])
+    screen = result["screen"]
+    for y in range(HEIGHT):
+        row = screen[y * ROW_BYTES : (y + 1) * ROW_BYTES]
+        drawn = [int(bit) for bit in f"{int.from_bytes(row, 'big'):0{WIDTH}b}"]
+        assert drawn == expected[y], f"row {y}"
+
+
+@pytest.mark.parametrize(
+    "line",
+    [(200, 10, 260, 40), (260, 50, 200, 80), (300, 10, 310, 90), (330, 10, 320, 90)]
+    + [(100, 200, 150, 150), (0, 0, 511, 255), (511, 0, 0, 255)],
+)
+def test_screen_line(tmp_path, line):
+    # one pixel for every step along the longer side, the nearest to the line
+    x1, y1, x2, y2 = line
+    main = f"        do Screen.drawLine({x1}, {y1}, {x2}, {y2});"
+    result = run(tmp_path, main, ARRAY + ["Screen"])
+    screen = int.from_bytes(result["screen"], "big")
+    drawn = {
+        (x, y)
+        for y in range(HEIGHT)
+        for x in range(WIDTH)
+        if screen >> ((HEIGHT - y) * WIDTH - 1 - x) & 1
+    }
+    steep = abs(y2 - y1) > abs(x2 - x1)
+    if steep:
+        drawn = {(y, x) for x, y in drawn}
+        x1, y1, x2, y2 = y1, x1, y2, x2
+    assert (x1, y1) in drawn and (x2, y2) in drawn
+    assert sorted(x for x, _ in drawn) == list(range(min(x1, x2), max(x1, x2) + 1))
+    for x, y in drawn:
+        assert abs(y - (y1 + (x - x1) * (y2 - y1) / (x2 - x1))) <= 0.5
@@ -0,0 +1,205 @@
+"""
+build a program into a .hack ROM, in one process, without intermediate files
+
+    .jack --jack_compiler--> vm commands --vm_translator--> asm --assembler--> .hack
+
+every stage hands its output to the next one in memory,
+as lists of tokens, lines of assembly and machine words.
+only the ROM is written.
+
+    python toolchain/build.py "11 Compiler II: Code Generation/Pong" --os
+    python toolchain/build.py "08 VM II: Program Control/FunctionCalls/StaticsTest"
+"""
+
+import sys
+from os import PathLike
+from pathlib import Path
+from typing import Iterable, Iterator
+
+ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(ROOT / "06 Assembler"))
+sys.path.insert(0, str(ROOT / "08 VM II: Program Control"))
+sys.path.insert(0, str(ROOT / "11 Compiler II: Code Generation"))
+
+import assembler
+import vm_translator
+from jack_compiler import CompileError, compile_class, token_error
+from jack_tokenizer import TokenError, tokenize
+
+OS = ROOT / "12 Operating System"
+
+ROM = 32768
+
+Command = tuple[list[str], str]
+
+
+class BuildError(Exception):
+    pass
+
+
+def reset():
+    """
+    the assembler and the translator keep their tables in module globals,
+    start every build from scratch
+    """
+    assembler.symbol_table = assembler.SymbolTable()
+    vm_translator.increment_table = vm_translator.IncrementTable()
+    vm_translator.Label.count.clear()
+
+
+def source_files(sources: Iterable[PathLike]) -> Iterator[Path]:
+    for source in map(Path, sources):
+        if source.is_dir():
+            jack_files = sorted(source.glob("*.jack"))
+            yield from jack_files
+            # Foo.vm next to Foo.jack is compiled from it, maybe out of date
+            compiled = {jack_file.stem for jack_file in jack_files}
+            for vm_file in sorted(source.glob("*.vm")):
+                if vm_file.stem not in compiled:
+                    yield vm_file
+        elif source.suffix in [".jack", ".vm"]:
+            yield source
+        else:
+            raise BuildError(f"{source} is neither a folder, a .jack nor a .vm file")
+
+
+def class_commands(source: Path) -> list[Command]:
+    """
+    vm commands of one class, tagged with its name for static variables
+    """
+    if source.suffix == ".jack":
+        try:
+            code = compile_class(tokenize(source))
+        except CompileError as error:
+            raise BuildError(f"{source}: {error}") from None
+        except TokenError as error:
+            raise BuildError(str(token_error(source, error))) from None
+        return [(tokens, source.stem) for tokens in code]
+    with open(source, "rt") as code:
+        return list(vm_translator.Parser().stream(code, source.stem))
+
+
+def commands(sources: Iterable[PathLike], os: bool = False) -> list[Command]:
+    """
+    vm commands of the whole program. with `os`, the classes of
+    `12 Operating System` which the program doesn't define itself are added
+    """
+    classes = {}
+    for source in source_files(sources):
+        if source.stem in classes:
+            raise BuildError(f"class {source.stem} is defined twice")
+        classes[source.stem] = class_commands(source)
+    if os:
+        for source in sorted(OS.glob("*.jack")):
+            if source.stem not in classes:
+                classes[source.stem] = class_commands(source)
+    return [command for code in classes.values() for command in code]
+
+
+def check_calls(program: list[Command], bootstrap: bool):
+    """
+    a call to a missing function would be assembled as a variable,
+    and jump to somewhere random, so stop here
+    """
+    defined = {tokens[1] for tokens, _ in program if tokens[0] == "function"}
+    called = {tokens[1] for tokens, _ in program if tokens[0] == "call"}
+    if bootstrap:
+        called.add("Sys.init")
+    missing = sorted(called - defined)
+    if missing:
+        hint = ", try --os" if any("." in name for name in missing) else ""
+        raise BuildError(f"undefined functions: {', '.join(missing)}{hint}")
+
+
+def translate(program: Iterable[Command], bootstrap: bool = True) -> Iterator[str]:
+    translator = vm_translator.Translator()
+    if bootstrap:
+        yield from translator.bootstrap()
+    for tokens, filename in program:
+        yield from translator.translate(tokens, filename)
+    yield from translator.routines()
+
+
+def assemble(asm: Iterable[str]) -> Iterator[str]:
+    """
+    16 bits machine code of every instruction.
+    the translator writes clean lines, no comments or spaces, so they skip
+    the parser of the assembler: the labels are placed in one pass, then
+    every line is encoded, each distinct c-instruction once.
+    a program larger than the ROM, or a constant which doesn't fit in the
+    15 bits of an A-instruction, would come out as other instructions
+    """
+    lines = list(asm)
+    assembler.Parser(None).first_pass(lines)
+    c_instructions = {}
+    size = 0
+    for line in lines:
+        if line.startswith("("):
+            continue
+        size += 1
+        if size > ROM:
+            raise BuildError(f"the program is larger than the ROM, {ROM} words")
+        if line.startswith("@"):
+            value = line[1:]
+            if not value.isdigit():
+                yield f"0{assembler.symbol_table[value]:015b}"
+                continue
+            if int(value) > 32767:
+                raise BuildError(f"@{value} is out of range 0..32767")
+            yield f"0{int(value):015b}"
+        else:
+            bits = c_instructions.get(line)
+            if bits is None:
+                instruction = assembler.Instruction(line)
+                bits = c_instructions[line] = assembler.Code.encode(instruction)
+            yield bits
+
+
+def build(
+    sources: Iterable[PathLike],
+    os: bool = False,
+    bootstrap: bool = True,
+    inline: bool = False,
+    tail_calls: bool = False,
+) -> list[str]:
+    """
+    the ROM of a program, one 16 bits binary string per word
+    """
+    reset()
+    program = commands(sources, os)
+    check_calls(program, bootstrap)
+    if inline:
+        program = vm_translator.Inliner().inline(program)
+    if tail_calls:
+        program = vm_translator.TailCalls().optimize(program)
+    return list(assemble(translate(program, bootstrap)))
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="build .jack/.vm sources into .hack")
+    parser.add_argument("sources", type=Path, nargs="+", help="folders or files")
+    parser.add_argument("-o", "--output", type=Path, help="default: <source>.hack")
+    parser.add_argument(
+        "--os", action="store_true", help="add the classes of 12 Operating System"
+    )
+    parser.add_argument("--no-bootstrap", action="store_true")
+    parser.add_argument("--inline", action="store_true")
+    parser.add_argument("--tail-calls", action="store_true")
+    args = parser.parse_args()
+
+    output = args.output or Path(args.sources[0].resolve().stem + ".hack")
+    start = time.perf_counter()
+    try:
+        rom = build(
+            args.sources, args.os, not args.no_bootstrap, args.inline, args.tail_calls
+        )
+    except BuildError as error:
+        sys.exit(f"error: {error}")
+    with open(output, "wt") as out:
+        out.write("".join(word + "\n" for word in rom))
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{output}: {len(rom)} words in {elapsed:.1f}ms")
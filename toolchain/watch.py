@@ -0,0 +1,313 @@
+"""
+rebuild a program whenever one of its files changes
+
+    python toolchain/watch.py "08 VM II: Program Control/FunctionCalls/StaticsTest"
+
+the daemon stays warm: every class (.vm or .jack) is translated once and kept
+as half-assembled machine words, only the changed class is translated again.
+then the classes are linked, which only places them and resolves their labels,
+and <folder>/<folder>.asm and .hack are written. every folder has its own
+static variables and labels, as if it was built alone.
+
+with --check, every rebuild is compared with the ROM build.py makes. the
+comparison is from scratch: incrementally, a static variable added to a class
+is put after all the others, where a full build would put it in between.
+
+files are polled, python has no portable file notification.
+"""
+
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable
+
+from build import (
+    OS,
+    ROM,
+    BuildError,
+    assembler,
+    build,
+    check_calls,
+    class_commands,
+    source_files,
+    vm_translator,
+)
+
+# RAM[16..255], where the translator puts static variables
+STATICS = 240
+
+
+class Unit:
+    """
+    one class of the program, translated to assembly and assembled
+    except for symbols, whose addresses are known after linking
+    """
+
+    def __init__(self, source: Path):
+        self.source = source
+        self.mtime = source.stat().st_mtime_ns
+        self.commands = class_commands(source)
+        self.asm = []
+        # one translator for the class, it scopes labels to their function
+        translator = vm_translator.Translator()
+        try:
+            for tokens, filename in self.commands:
+                self.asm += translator.translate(tokens, filename)
+        except Exception as error:
+            # the translator raises plain exceptions on unknown commands
+            raise BuildError(f"{source}: {error}") from None
+        # the routines of call and return it jumps to, linked once
+        self.shared = translator.shared
+        # an int for every finished word, a str for every symbol
+        self.words = []
+        # label -> offset in this unit
+        self.labels = {}
+        self.assemble(self.asm)
+
+    @classmethod
+    def generated(cls, translator: vm_translator.Translator, asm: Iterable[str]):
+        """
+        code of the translator itself, not of a class
+        """
+        unit = cls.__new__(cls)
+        unit.source = None
+        unit.mtime = None
+        unit.commands = []
+        unit.asm = list(asm)
+        unit.shared = translator.shared
+        unit.words = []
+        unit.labels = {}
+        unit.assemble(unit.asm)
+        return unit
+
+    @classmethod
+    def bootstrap(cls):
+        translator = vm_translator.Translator()
+        return cls.generated(translator, translator.bootstrap())
+
+    @classmethod
+    def routines(cls, shared: set[str]):
+        translator = vm_translator.Translator()
+        translator.shared = shared
+        return cls.generated(translator, translator.routines())
+
+    def assemble(self, asm: list[str]):
+        for line in assembler.Parser(None).tidy(asm):
+            if line.startswith("("):
+                label = line.strip(" ()")
+                if label in self.labels:
+                    raise BuildError(f"{self.source}: label {label} is defined twice")
+                self.labels[label] = len(self.words)
+                continue
+            ins = assembler.Instruction(line)
+            if ins.type == ins.A and ins.is_symbol:
+                self.words.append(ins.value)
+            elif ins.type == ins.A and int(ins.value) > 32767:
+                raise BuildError(
+                    f"{self.source}: @{ins.value} is out of range 0..32767"
+                )
+            else:
+                self.words.append(int(assembler.Code.encode(ins), 2))
+
+    def changed(self, source: Path) -> bool:
+        return source != self.source or source.stat().st_mtime_ns != self.mtime
+
+
+def link(units: list[Unit]) -> list[int]:
+    """
+    place the units one after another, like the two passes of the assembler:
+    labels first, then variables in the order they appear
+    """
+    symbols = assembler.SymbolTable()
+    base = 0
+    for unit in units:
+        for label, offset in unit.labels.items():
+            if label in symbols:
+                raise BuildError(f"label {label} is defined twice")
+            symbols[label] = base + offset
+        base += len(unit.words)
+    if base > ROM:
+        raise BuildError(f"the program is larger than the ROM, {ROM} words")
+
+    rom = []
+    for unit in units:
+        for word in unit.words:
+            if isinstance(word, str):
+                symbols.add(word)
+                word = symbols[word]
+            rom.append(word)
+    return rom
+
+
+class Watcher:
+    def __init__(self, folder: Path, os: bool = False):
+        self.folder = folder.resolve()
+        self.os = os
+        # class name -> unit
+        self.units = {}
+        # the statics and label counts of this program, see `tables`
+        self.statics = vm_translator.IncrementTable()
+        self.label_count = defaultdict(int)
+        # whether the last rebuild failed
+        self.failed = False
+
+    def sources(self) -> dict[str, Path]:
+        sources = {source.stem: source for source in source_files([self.folder])}
+        if self.os:
+            for source in sorted(OS.glob("*.jack")):
+                sources.setdefault(source.stem, source)
+        return sources
+
+    @contextmanager
+    def tables(self):
+        """
+        the translator keeps statics and label counts in module globals,
+        every watcher swaps its own in while it translates
+        """
+        saved = vm_translator.increment_table, vm_translator.Label.count
+        vm_translator.increment_table = self.statics
+        vm_translator.Label.count = self.label_count
+        try:
+            yield
+        finally:
+            vm_translator.increment_table, vm_translator.Label.count = saved
+
+    def translate(self, sources: dict[str, Path], names: list[str]):
+        with self.tables():
+            for name in names:
+                self.units[name] = Unit(sources[name])
+
+    def program(self, sources: dict[str, Path]) -> tuple[list[Unit], list[int]]:
+        """
+        the units of the sources, in the order build.py puts them, and the ROM
+        """
+        units = [self.units[name] for name in sources]
+        program = [command for unit in units for command in unit.commands]
+        bootstrap = any(tokens[:2] == ["function", "Sys.init"] for tokens, _ in program)
+        check_calls(program, bootstrap)
+        if bootstrap:
+            with self.tables():
+                units.insert(0, Unit.bootstrap())
+        units.append(Unit.routines(set().union(*(unit.shared for unit in units))))
+        return units, link(units)
+
+    def poll(self) -> bool:
+        """
+        rebuild if anything changed, return whether it did
+        """
+        sources = self.sources()
+        changed = [
+            name
+            for name, source in sources.items()
+            if name not in self.units or self.units[name].changed(source)
+        ]
+        removed = [name for name in self.units if name not in sources]
+        if not changed and not removed:
+            return False
+
+        start = time.perf_counter()
+        for name in removed:
+            del self.units[name]
+        try:
+            self.translate(sources, changed)
+            if self.statics.count > STATICS:
+                # static addresses of deleted variables are never reused,
+                # start over when they run out
+                self.statics = vm_translator.IncrementTable()
+                self.label_count = defaultdict(int)
+                changed, self.units = list(sources), {}
+                self.translate(sources, changed)
+                if self.statics.count > STATICS:
+                    raise BuildError(
+                        f"{self.statics.count} static variables,"
+                        f" RAM[16..255] holds {STATICS}"
+                    )
+            translated = time.perf_counter()
+            units, rom = self.program(sources)
+            linked = time.perf_counter()
+        except (BuildError, OSError) as error:
+            self.log(f"error: {error}")
+            self.failed = True
+            # try again when the file changes
+            for name in changed:
+                self.units.pop(name, None)
+            return False
+
+        stem = self.folder / self.folder.name
+        with open(stem.with_suffix(".asm"), "wt") as out:
+            for unit in units:
+                out.write("".join(line + "\n" for line in unit.asm))
+        with open(stem.with_suffix(".hack"), "wt") as out:
+            out.write("".join(f"{word:016b}\n" for word in rom))
+        written = time.perf_counter()
+        self.failed = False
+
+        what = ", ".join(changed + [f"-{name}" for name in removed])
+        self.log(
+            f"{what}: translate {(translated - start) * 1000:.1f}ms,"
+            f" link {(linked - translated) * 1000:.1f}ms,"
+            f" write {(written - linked) * 1000:.1f}ms, {len(rom)} words"
+        )
+        return True
+
+    def check(self) -> bool:
+        """
+        whether the watcher and build.py build the same ROM from scratch
+        """
+        sources = self.sources()
+        fresh = Watcher(self.folder, self.os)
+        fresh.translate(sources, list(sources))
+        units, watched = fresh.program(sources)
+        bootstrap = units[0].source is None
+
+        # build.py starts from new module globals, put the old ones back
+        saved = (
+            assembler.symbol_table,
+            vm_translator.increment_table,
+            dict(vm_translator.Label.count),
+        )
+        try:
+            built = [int(word, 2) for word in build([self.folder], self.os, bootstrap)]
+        finally:
+            assembler.symbol_table, vm_translator.increment_table, count = saved
+            vm_translator.Label.count.clear()
+            vm_translator.Label.count.update(count)
+        return watched == built
+
+    def log(self, message: str):
+        print(f"{time.strftime('%H:%M:%S')} {self.folder.name} {message}", flush=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="rebuild programs on every change")
+    parser.add_argument("folders", type=Path, nargs="+")
+    parser.add_argument(
+        "--os", action="store_true", help="add the classes of 12 Operating System"
+    )
+    parser.add_argument("--interval", type=float, default=0.2, help="seconds")
+    parser.add_argument("--once", action="store_true", help="build and exit")
+    parser.add_argument(
+        "--check", action="store_true", help="compare every rebuild with build.py"
+    )
+    args = parser.parse_args()
+
+    watchers = [Watcher(folder, args.os) for folder in args.folders]
+    failed = False
+    try:
+        while True:
+            for watcher in watchers:
+                if watcher.poll() and args.check:
+                    same = watcher.check()
+                    watcher.log("same as build.py" if same else "differs from build.py")
+                    failed |= not same
+            if args.once:
+                failed |= any(watcher.failed for watcher in watchers)
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        sys.exit()
+    sys.exit(1 if failed else 0)